@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+from registry import POIRegistry
+
+# Map-reduce versions of the distinct-count / coverage queries for nightly full recomputes.
+# The registry keeps the visit log as three int64 columns (visitor id, poi id, type code),
+# appended by record_visit. They are copied unsorted into one shared-memory block and a
+# ProcessPoolExecutor runs three rounds over it:
+#   count:   each worker scans one slice and counts its rows per hash partition (key % parts)
+#   scatter: each worker copies its slice's rows into the partition regions of a second block,
+#            at offsets the parent derived from the counts (prefix sums over a parts x slices table)
+#   reduce:  each worker aggregates one partition into {key: (distinct_count, distinct_types)}
+# Archived rows (their POI was deleted) are dropped while mapping unless asked for. Partitions
+# own disjoint keys, so the parent only merges small dicts; it never sorts or builds tuples.
+# Outputs are identical to the serial POIRegistry methods.
+
+_ITEM = 8  # bytes per int64
+_SPLIT = 4  # slices / partitions per worker, to even out skew
+
+
+@contextmanager
+def _attached(name: str, n: int):
+    # the block's three int64 columns of n rows; views are released before the block closes
+    shm = shared_memory.SharedMemory(name=name)
+    flat = shm.buf[:3 * n * _ITEM].cast("q")
+    cols = [flat[j * n:(j + 1) * n] for j in range(3)]
+    try:
+        yield cols
+    finally:
+        for col in cols:
+            col.release()
+        flat.release()
+        shm.close()
+
+def _rows(cols, lo: int, hi: int, by: str, dead: frozenset):
+    # (key, other, code) for one slice of the visit columns, minus archived rows
+    visitors, pois, codes = cols
+    for vid, pid, code in zip(visitors[lo:hi], pois[lo:hi], codes[lo:hi]):
+        if pid in dead:
+            continue
+        yield (vid, pid, code) if by == "visitor" else (pid, vid, code)
+
+def _count_job(args) -> List[int]:
+    name, n, lo, hi, by, dead, parts = args
+    counts = [0] * parts
+    with _attached(name, n) as cols:
+        for key, _other, _code in _rows(cols, lo, hi, by, dead):
+            counts[key % parts] += 1
+    return counts
+
+def _scatter_job(args) -> None:
+    name, n, lo, hi, by, dead, parts, out_name, m, fill = args
+    with _attached(name, n) as cols, _attached(out_name, m) as out:
+        keys, others, codes = out
+        for key, other, code in _rows(cols, lo, hi, by, dead):
+            part = key % parts
+            i = fill[part]
+            keys[i], others[i], codes[i] = key, other, code
+            fill[part] = i + 1
+
+def _reduce_job(args) -> Dict[int, Tuple[int, int]]:
+    name, m, lo, hi = args
+    seen: Dict[int, set] = {}
+    kinds: Dict[int, int] = {}   # key -> bitmask over type codes
+    with _attached(name, m) as (keys, others, codes):
+        for key, other, code in zip(keys[lo:hi], others[lo:hi], codes[lo:hi]):
+            seen.setdefault(key, set()).add(other)
+            kinds[key] = kinds.get(key, 0) | 1 << code
+    return {key: (len(s), kinds[key].bit_count()) for key, s in seen.items()}
+
+def _shared(cols, n: int) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=3 * n * _ITEM)
+    for j, col in enumerate(cols):
+        if col is not None:
+            shm.buf[j * n * _ITEM:(j + 1) * n * _ITEM] = memoryview(col).cast("B")
+    return shm
+
+def _map_reduce(reg: POIRegistry, by: str, workers: int | None,
+                include_archived: bool) -> Dict[int, Tuple[int, int]]:
+    cols = reg.visit_columns()
+    n = len(cols[0])
+    if n == 0:
+        return {}
+    dead = frozenset() if include_archived else frozenset(reg.deleted_poi_ids())
+    workers = workers or os.cpu_count() or 1
+    parts = workers * _SPLIT
+    slices = [(i * n // parts, (i + 1) * n // parts) for i in range(parts)]
+    src = _shared(cols, n)
+    out = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(_count_job, [(src.name, n, lo, hi, by, dead, parts)
+                                                for lo, hi in slices]))
+            sizes = [sum(c[p] for c in counts) for p in range(parts)]
+            m = sum(sizes)
+            if m == 0:
+                return {}
+            base = [0] * (parts + 1)
+            for p in range(parts):
+                base[p + 1] = base[p] + sizes[p]
+            # slice s writes partition p's rows at base[p] + rows of p in slices before s
+            fills, run = [], base[:-1]
+            for c in counts:
+                fills.append(run)
+                run = [a + b for a, b in zip(run, c)]
+            out = _shared((None, None, None), m)
+            list(pool.map(_scatter_job, [(src.name, n, lo, hi, by, dead, parts, out.name, m, fill)
+                                         for (lo, hi), fill in zip(slices, fills)]))
+            merged: Dict[int, Tuple[int, int]] = {}
+            for part in pool.map(_reduce_job, [(out.name, m, base[p], base[p + 1])
+                                               for p in range(parts) if sizes[p]]):
+                merged.update(part)   # partitions own disjoint keys
+            return merged
+    finally:
+        for shm in (src, out):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+
+def parallel_counts_distinct_pois_per_visitor(reg: POIRegistry, workers: int | None = None,
+                                              include_archived: bool = False):
+    """Same result as reg.counts_distinct_pois_per_visitor(include_archived)."""
+    agg = _map_reduce(reg, "visitor", workers, include_archived)
+    rows = []
+    for v in reg.list_visitors():
+        cnt = agg.get(v.id, (0, 0))[0]
+        rows.append((-cnt, v.id, v.name, v, cnt))
+    rows.sort(key=lambda t: (t[0], t[1], t[2]))
+    return [(v, cnt) for (_nc, _id, _nm, v, cnt) in rows]
+
+def parallel_counts_distinct_visitors_per_poi(reg: POIRegistry, workers: int | None = None):
+    """Same result as reg.counts_distinct_visitors_per_poi()."""
+    agg = _map_reduce(reg, "poi", workers, include_archived=False)
+    rows = []
+    for p in reg.list_pois():
+        cnt = agg.get(p.id, (0, 0))[0]
+        rows.append((-cnt, p.id, p.name, p, cnt))
+    rows.sort(key=lambda t: (t[0], t[1], t[2]))
+    return [(p, cnt) for (_nc, _id, _nm, p, cnt) in rows]
+
+def parallel_visitors_meeting_coverage(reg: POIRegistry, m: int, t: int, workers: int | None = None,
+                                       include_archived: bool = False):
+    """Same result as reg.visitors_meeting_coverage(m, t, include_archived)."""
+    if m < 0 or t < 0:
+        raise ValueError("m and t must be non-negative integers")
+    agg = _map_reduce(reg, "visitor", workers, include_archived)
+    rows = []
+    for v in reg.list_visitors():
+        pois, types = agg.get(v.id, (0, 0))
+        if pois >= m and types >= t:
+            rows.append((-pois, -types, v.id, v.name, v, pois, types))
+    rows.sort(key=lambda r: (r[0], r[1], r[2], r[3]))
+    return [(v, pois, types) for (_np, _nt, _id, _nm, v, pois, types) in rows]
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator
+
+# Compressed integer set in the spirit of Roaring bitmaps: values are split into a 16-bit
+# chunk key (x >> 16) and a 16-bit low part. A chunk holds its low parts either as a sorted
+# array('H') (2 bytes per value) while small, or as one 65536-bit int once denser than that.
+# Python sets cost ~30-70 bytes per element; this stays at <= 2 bytes for sparse chunks.
+
+_CHUNK = 16
+_LOW = (1 << _CHUNK) - 1
+_ARRAY_MAX = 4096  # 4096 * 2 bytes == the 8 KiB a full bitmap chunk costs
+
+
+class Bitmap:
+    __slots__ = ("_chunks", "_len")
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._chunks: Dict[int, array | int] = {}
+        self._len = 0
+        for x in values:
+            self.add(x)
+
+    def add(self, x: int) -> bool:
+        """Insert x; True if it was not present."""
+        key, low = x >> _CHUNK, x & _LOW
+        c = self._chunks.get(key)
+        if c is None:
+            self._chunks[key] = array("H", [low])
+        elif isinstance(c, int):
+            bit = 1 << low
+            if c & bit:
+                return False
+            self._chunks[key] = c | bit
+        else:
+            i = bisect_left(c, low)
+            if i < len(c) and c[i] == low:
+                return False
+            c.insert(i, low)
+            if len(c) > _ARRAY_MAX:
+                bits = 0
+                for v in c:
+                    bits |= 1 << v
+                self._chunks[key] = bits
+        self._len += 1
+        return True
+
+    def discard(self, x: int) -> bool:
+        """Remove x; True if it was present."""
+        key, low = x >> _CHUNK, x & _LOW
+        c = self._chunks.get(key)
+        if c is None:
+            return False
+        if isinstance(c, int):
+            bit = 1 << low
+            if not c & bit:
+                return False
+            c ^= bit
+            if c.bit_count() <= _ARRAY_MAX:
+                c = array("H", (v for v in range(_LOW + 1) if c >> v & 1))
+            self._chunks[key] = c
+        else:
+            i = bisect_left(c, low)
+            if i == len(c) or c[i] != low:
+                return False
+            del c[i]
+        if not c:
+            del self._chunks[key]
+        self._len -= 1
+        return True
+
+    def __contains__(self, x: int) -> bool:
+        c = self._chunks.get(x >> _CHUNK)
+        if c is None:
+            return False
+        low = x & _LOW
+        if isinstance(c, int):
+            return bool(c >> low & 1)
+        i = bisect_left(c, low)
+        return i < len(c) and c[i] == low
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        """Ascending order."""
+        for key in sorted(self._chunks):
+            c, base = self._chunks[key], key << _CHUNK
+            if isinstance(c, int):
+                while c:
+                    low = c & -c
+                    yield base | (low.bit_length() - 1)
+                    c ^= low
+            else:
+                for low in c:
+                    yield base | low
+
+    def __repr__(self) -> str:
+        return f"Bitmap(len={self._len}, chunks={len(self._chunks)})"
@@ -1,6 +1,9 @@
 from __future__ import annotations
 import json
-from typing import Any, Dict, List
+import os
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple
 from registry import POIRegistry
 from models import DATE_FMT  
 
@@ -24,10 +27,12 @@ def _is_list(x: Any) -> bool:
 def _is_dict(x: Any) -> bool:
     return isinstance(x, dict)
 
-def load_config_json(path: str, reg: POIRegistry) -> None:
+def load_config_json(path: str, reg: POIRegistry, lazy_visits: bool = False) -> None:
     """
     Load initial data into `reg` from a JSON file.
     The file is OPTIONAL per run — call this only if you want to preload data.
+    With lazy_visits=True, types/POIs/visitors load now; the `visits` array is only
+    syntax-checked and indexed by offset, and recorded on the first visit-based call.
 
     Expected shape (keys optional; empty arrays allowed):
     {
@@ -38,9 +43,13 @@ def load_config_json(path: str, reg: POIRegistry) -> None:
       "visits":   [ {"visitor_id": 1, "poi_id": 1, "date": "01/10/2025", "rating": 7}, ... ]
     }
     """
+    lazy = None
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        if lazy_visits:
+            data, lazy = _read_deferring_visits(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
     except FileNotFoundError as e:
         raise ConfigError(f"$: file not found: {path}") from e
     except json.JSONDecodeError as e:
@@ -104,22 +113,147 @@ def load_config_json(path: str, reg: POIRegistry) -> None:
             raise ConfigError(f"{p}: {e}") from e
 
     # ---- visits ----
+    if lazy is not None:
+        reg.defer_visits(lazy)
+        return
     visits = data.get("visits", [])
     _expect(_is_list(visits), "$.visits", "must be an array")
+    _backfill_visits(visits, reg)
+
+def _backfill_visits(visits: Iterable[Any], reg: POIRegistry) -> None:
+    # backfill: co-visitation counts (if enabled) are rebuilt once at the end instead of per visit
+    if not reg.co_visitation_enabled:
+        _load_visits(visits, reg)
+        return
+    reg.pause_co_visitation()
+    try:
+        _load_visits(visits, reg)
+    finally:
+        reg.rebuild_co_visitation()
+
+def _load_visits(visits: Iterable[Any], reg: POIRegistry) -> None:
     for i, v in enumerate(visits):
         p = f"$.visits[{i}]"
-        _expect(_is_dict(v), p, "must be an object")
-        vid = v.get("visitor_id")
-        pid = v.get("poi_id")
-        date = v.get("date")
-        rating = v.get("rating", None)
-        _expect(_is_int(vid), p + ".visitor_id", "must be an integer")
-        _expect(_is_int(pid), p + ".poi_id", "must be an integer")
-        _expect(_is_str(date) and date.strip(), p + ".date", f"must be 'dd/mm/yyyy' (e.g., 01/10/2025)")
-        # rating: optional; if present, must be int 1..10 (registry enforces again)
-        if rating is not None and not _is_int(rating):
-            raise ConfigError(f"{p}.rating: must be an integer 1..10 if provided")
+        vid, pid, date, rating = validate_visit(v, p)
         try:
             reg.record_visit(vid, pid, date, rating)
         except Exception as e:
             raise ConfigError(f"{p}: {e}") from e
+
+def validate_visit(v: Any, p: str) -> Tuple[int, int, str, int | None]:
+    """Check one visit object's shape; return (visitor_id, poi_id, date, rating)."""
+    _expect(_is_dict(v), p, "must be an object")
+    vid = v.get("visitor_id")
+    pid = v.get("poi_id")
+    date = v.get("date")
+    rating = v.get("rating", None)
+    _expect(_is_int(vid), p + ".visitor_id", "must be an integer")
+    _expect(_is_int(pid), p + ".poi_id", "must be an integer")
+    _expect(_is_str(date) and date.strip(), p + ".date", f"must be 'dd/mm/yyyy' (e.g., 01/10/2025)")
+    # rating: optional; if present, must be int 1..10 (registry enforces again)
+    if rating is not None and not _is_int(rating):
+        raise ConfigError(f"{p}.rating: must be an integer 1..10 if provided")
+    return vid, pid, date, rating
+
+
+# ---- lazy visits: scan the top-level object, index the visits array by offset ----
+_WS = re.compile(r"[ \t\n\r]*")
+
+class _LazyVisits:
+    """Where the `visits` array sits in the file (byte span) and where each element sits
+    inside it (character offsets into the decoded span). Called once with the registry."""
+    def __init__(self, path: str, byte_start: int, byte_end: int, starts: array, ends: array):
+        self.path = path
+        self.byte_start, self.byte_end = byte_start, byte_end
+        self.starts, self.ends = starts, ends
+        st = os.stat(path)
+        self._stamp = (st.st_size, st.st_mtime_ns)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __call__(self, reg: POIRegistry) -> None:
+        st = os.stat(self.path)
+        _expect((st.st_size, st.st_mtime_ns) == self._stamp, "$.visits",
+                f"{self.path} changed since it was loaded; reload the config")
+        with open(self.path, "rb") as f:
+            f.seek(self.byte_start)
+            span = f.read(self.byte_end - self.byte_start).decode("utf-8")
+        _backfill_visits((json.loads(span[a:b]) for a, b in zip(self.starts, self.ends)), reg)
+
+def _skip_ws(text: str, i: int) -> int:
+    return _WS.match(text, i).end()
+
+def _read_deferring_visits(path: str) -> Tuple[Any, _LazyVisits | None]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ConfigError(f"$: file is not valid UTF-8 (byte {e.start})") from e
+    dec = json.JSONDecoder()
+    i = _skip_ws(text, 0)
+    if not text.startswith("{", i):
+        return json.loads(text), None  # not an object: the usual checks report it
+    data: Dict[str, Any] = {}
+    span = None
+    i = _skip_ws(text, i + 1)
+    if text.startswith("}", i):
+        i += 1
+    else:
+        while True:
+            if not text.startswith('"', i):
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, i)
+            key, i = dec.raw_decode(text, i)
+            i = _skip_ws(text, i)
+            if not text.startswith(":", i):
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, i)
+            i = _skip_ws(text, i + 1)
+            if key == "visits" and text.startswith("[", i):
+                data.pop("visits", None)      # duplicate keys: the last one wins, like json.load
+                span, i = _index_array(text, dec, i)
+            else:
+                data[key], i = dec.raw_decode(text, i)
+                if key == "visits":
+                    span = None
+            i = _skip_ws(text, i)
+            if text.startswith(",", i):
+                i = _skip_ws(text, i + 1)
+            elif text.startswith("}", i):
+                i += 1
+                break
+            else:
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, i)
+    i = _skip_ws(text, i)
+    if i != len(text):
+        raise json.JSONDecodeError("Extra data", text, i)
+    if span is None:
+        return data, None
+    start, end, starts, ends = span
+    if len(raw) == len(text):                  # pure ASCII: characters are bytes
+        byte_start, byte_end = start, end
+    else:
+        byte_start = len(text[:start].encode("utf-8"))
+        byte_end = byte_start + len(text[start:end].encode("utf-8"))
+    return data, _LazyVisits(path, byte_start, byte_end, starts, ends)
+
+def _index_array(text: str, dec: json.JSONDecoder, i: int):
+    # every element is still parsed (so syntax errors surface at load time) but not kept;
+    # only its offsets relative to the opening '[' are stored
+    start = i
+    starts, ends = array("q"), array("q")
+    i = _skip_ws(text, i + 1)
+    if text.startswith("]", i):
+        return (start, i + 1, starts, ends), i + 1
+    while True:
+        a = i
+        _value, i = dec.raw_decode(text, i)
+        starts.append(a - start)
+        ends.append(i - start)
+        i = _skip_ws(text, i)
+        if text.startswith(",", i):
+            i = _skip_ws(text, i + 1)
+        elif text.startswith("]", i):
+            return (start, i + 1, starts, ends), i + 1
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, i)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+# (poi_ids, indptr, indices, data): row i is poi_ids[i]; its neighbours are
+# poi_ids[indices[indptr[i]:indptr[i+1]]] with shared-visitor counts in data[...]
+CSR = Tuple[array, array, array, array]
+_EMPTY_CSR: CSR = (array("q"), array("q", [0]), array("q"), array("q"))
+
+
+class CoVisitation:
+    """Sparse, symmetric POI x POI counts of shared DISTINCT visitors.
+    Row p maps q -> number of visitors who visited both p and q (p != q).
+
+    Stored as the CSR arrays of the last bulk rebuild plus a dict-of-dicts delta holding only
+    the first visits recorded since; row() merges the two. Dropped POIs leave the delta at once
+    but stay in the CSR columns until the next rebuild, so callers skip inactive ids."""
+    def __init__(self, csr: CSR | None = None):
+        self._csr: CSR = csr if csr is not None else _EMPTY_CSR
+        self._delta: Dict[int, Dict[int, int]] = {}
+
+    def add_first_visit(self, poi_id: int, visited: Iterable[int]) -> None:
+        """A visitor touched `poi_id` for the first time; `visited` are their earlier POIs."""
+        row = self._delta.setdefault(poi_id, {})
+        for q in visited:
+            row[q] = row.get(q, 0) + 1
+            other = self._delta.setdefault(q, {})
+            other[poi_id] = other.get(poi_id, 0) + 1
+
+    def drop(self, poi_id: int) -> None:
+        """Forget a POI's delta row and column (ids are never reused, so its CSR row is dead)."""
+        for q in self._delta.pop(poi_id, {}):
+            other = self._delta.get(q)
+            if other is not None:
+                other.pop(poi_id, None)
+
+    def row(self, poi_id: int) -> Dict[int, int]:
+        poi_ids, indptr, indices, data = self._csr
+        out: Dict[int, int] = {}
+        i = bisect_left(poi_ids, poi_id)
+        if i < len(poi_ids) and poi_ids[i] == poi_id:
+            a, b = indptr[i], indptr[i + 1]
+            out = {poi_ids[j]: c for j, c in zip(indices[a:b], data[a:b])}
+        for q, c in self._delta.get(poi_id, {}).items():
+            out[q] = out.get(q, 0) + c
+        return out
+
+
+def co_visitation_csr(visitor_pois: Dict[int, Iterable[int]]) -> CSR:
+    """Bulk rebuild: C = AᵀA without the diagonal, A = visitor x POI incidence.
+
+    A is laid out as CSR (visitor rows) and its transpose as CSR (POI rows) in flat
+    arrays, then each POI row of C is produced with a sparse accumulator
+    (Gustavson's row-by-row SpGEMM). No NumPy/SciPy needed.
+    """
+    # POI id <-> column index, ascending ids
+    poi_ids = array("q", sorted({pid for pids in visitor_pois.values() for pid in pids}))
+    col = {pid: j for j, pid in enumerate(poi_ids)}
+
+    # A as CSR: visitor rows -> POI columns
+    a_ptr, a_idx = array("q", [0]), array("q")
+    for pids in visitor_pois.values():
+        a_idx.extend(sorted(col[pid] for pid in pids))
+        a_ptr.append(len(a_idx))
+
+    # Aᵀ as CSR: POI rows -> visitor columns (counting sort by column)
+    n_poi = len(poi_ids)
+    t_ptr = array("q", bytes(8 * (n_poi + 1)))
+    for j in a_idx:
+        t_ptr[j + 1] += 1
+    for j in range(n_poi):
+        t_ptr[j + 1] += t_ptr[j]
+    t_idx = array("q", bytes(8 * len(a_idx)))
+    fill = array("q", t_ptr[:-1])
+    for r in range(len(a_ptr) - 1):
+        for j in a_idx[a_ptr[r]:a_ptr[r + 1]]:
+            t_idx[fill[j]] = r
+            fill[j] += 1
+
+    # C = Aᵀ A, one POI row at a time
+    indptr, indices, data = array("q", [0]), array("q"), array("q")
+    for i in range(n_poi):
+        acc: Dict[int, int] = {}
+        for r in t_idx[t_ptr[i]:t_ptr[i + 1]]:
+            for j in a_idx[a_ptr[r]:a_ptr[r + 1]]:
+                if j != i:
+                    acc[j] = acc.get(j, 0) + 1
+        for j in sorted(acc):
+            indices.append(j)
+            data.append(acc[j])
+        indptr.append(len(indices))
+    return poi_ids, indptr, indices, data
@@ -0,0 +1,45 @@
+from __future__ import annotations
+import csv
+import json
+from typing import Iterable, List, Sequence
+
+from registry import POIRegistry
+
+# Streaming exporters: rows come from the registry's iter_* queries and are written
+# one by one, so memory stays constant however many rows are exported.
+
+FORMATS = ("csv", "jsonl")
+
+def write_rows(path: str, header: Sequence[str], rows: Iterable[Sequence[object]], fmt: str = "csv") -> int:
+    """Write rows to `path` as CSV (with header) or JSONL (one object per row). Returns row count."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Export format must be one of {FORMATS}")
+    n = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            w = csv.writer(f)
+            w.writerow(header)
+            for row in rows:
+                w.writerow(row)
+                n += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(header, row)), ensure_ascii=False, default=str))
+                f.write("\n")
+                n += 1
+    return n
+
+def export_counts_distinct_visitors_per_poi(reg: POIRegistry, path: str, fmt: str = "csv") -> int:
+    rows = ((p.id, p.name, cnt) for p, cnt in reg.iter_counts_distinct_visitors_per_poi())
+    return write_rows(path, ["poi_id", "poi_name", "distinct_visitors"], rows, fmt)
+
+def export_visitors_for_poi(reg: POIRegistry, poi_id: int, path: str,
+                            fmt: str = "csv", distinct: bool = False) -> int:
+    rows = reg.iter_visitors_for_poi(poi_id, distinct=distinct)
+    return write_rows(path, ["date", "visitor_id", "name", "nationality"], rows, fmt)
+
+def export_pois_of_type(reg: POIRegistry, type_name: str, path: str, fmt: str = "csv") -> int:
+    attrs: List[str] = reg.type_attributes(type_name)
+    rows = ((p.id, p.name, p.coord[0], p.coord[1], *(vals[a] for a in attrs))
+            for p, vals in reg.iter_pois_of_type_with_values(type_name))
+    return write_rows(path, ["poi_id", "poi_name", "x", "y", *attrs], rows, fmt)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain, islice, takewhile
+from typing import Dict, Iterator, List, Set
+
+_INF = float("inf")
+
+def is_number(v: object) -> bool:
+    # bools are ints in Python, but "tickets < 15" should never match True
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+class SortedKeyList:
+    """Sorted list kept as a run of buckets of at most 2 * LOAD items (the sortedcontainers
+    layout, minus everything we don't need). An insert or delete memmoves one bucket,
+    not the whole list, so building an index of n items is O(n log n) instead of O(n^2)."""
+    LOAD = 512
+
+    def __init__(self):
+        self._lists: List[list] = []
+        self._maxes: List[object] = []  # _maxes[k] == _lists[k][-1]
+        self._len = 0
+
+    def add(self, item) -> None:
+        maxes, lists = self._maxes, self._lists
+        if not maxes:
+            lists.append([item])
+            maxes.append(item)
+        else:
+            k = bisect_left(maxes, item)
+            if k == len(maxes):
+                k -= 1
+                lists[k].append(item)
+                maxes[k] = item
+            else:
+                insort(lists[k], item)
+            lst = lists[k]
+            if len(lst) > 2 * self.LOAD:
+                half = lst[self.LOAD:]
+                del lst[self.LOAD:]
+                maxes[k] = lst[-1]
+                lists.insert(k + 1, half)
+                maxes.insert(k + 1, half[-1])
+        self._len += 1
+
+    def discard(self, item) -> bool:
+        maxes = self._maxes
+        k = bisect_left(maxes, item)
+        if k == len(maxes):
+            return False
+        lst = self._lists[k]
+        i = bisect_left(lst, item)
+        if i == len(lst) or lst[i] != item:
+            return False
+        del lst[i]
+        self._len -= 1
+        if lst:
+            maxes[k] = lst[-1]
+        else:
+            del self._lists[k]
+            del maxes[k]
+        return True
+
+    def iter_from(self, key, inclusive: bool = True) -> Iterator:
+        """Items >= key (> key when not inclusive), ascending."""
+        find = bisect_left if inclusive else bisect_right
+        k = find(self._maxes, key)
+        if k == len(self._maxes):
+            return iter(())
+        first = self._lists[k]
+        return chain(islice(first, find(first, key), None),
+                     chain.from_iterable(islice(self._lists, k + 1, None)))
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._lists)
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class AttributeIndex:
+    """Secondary index over one attribute of one POI type.
+
+    kind="sorted": SortedKeyList of (value, poi_id) for NUMERIC values -> equality and ranges via bisect.
+    kind="hash":   value -> {poi_id} for any hashable value -> equality only.
+    None / missing values are never indexed.
+    """
+    KINDS = ("sorted", "hash")
+
+    def __init__(self, kind: str = "sorted"):
+        if kind not in self.KINDS:
+            raise ValueError(f"Index kind must be one of {self.KINDS}")
+        self.kind = kind
+        self.stale = False  # set when the index can no longer be patched in place
+        self._entries = SortedKeyList()            # sorted kind
+        self._buckets: Dict[object, Set[int]] = {}  # hash kind
+
+    def add(self, poi_id: int, value: object) -> None:
+        if self.kind == "sorted":
+            if is_number(value):
+                self._entries.add((value, poi_id))
+        elif value is not None:
+            try:
+                self._buckets.setdefault(value, set()).add(poi_id)
+            except TypeError:
+                pass  # unhashable values (lists, dicts) are not indexable
+
+    def remove(self, poi_id: int, value: object) -> None:
+        if self.kind == "sorted":
+            if is_number(value):
+                self._entries.discard((value, poi_id))
+        elif value is not None:
+            try:
+                ids = self._buckets.get(value)
+            except TypeError:
+                return
+            if ids is not None:
+                ids.discard(poi_id)
+                if not ids:
+                    del self._buckets[value]
+
+    def equal(self, value: object) -> List[int]:
+        """poi ids whose value == `value`, ascending."""
+        if self.kind == "hash":
+            return sorted(self._buckets.get(value, ()))
+        return [pid for (_v, pid) in self.range(value, value)]
+
+    def range(self, lo: float | None = None, hi: float | None = None,
+              lo_incl: bool = True, hi_incl: bool = True) -> List[tuple]:
+        """[(value, poi_id)] with lo <(=) value <(=) hi, in (value, id) order. O(log n + hits)."""
+        if self.kind != "sorted":
+            raise ValueError("Range predicates need a 'sorted' index")
+        e = self._entries
+        if lo is None:
+            it = iter(e)
+        else:
+            it = e.iter_from((lo, -_INF)) if lo_incl else e.iter_from((lo, _INF), inclusive=False)
+        if hi is not None:
+            it = takewhile((lambda t: t[0] <= hi) if hi_incl else (lambda t: t[0] < hi), it)
+        return list(it)
+
+
+class NameIndex:
+    """Case-insensitive name search over entities keyed by integer id.
+
+    Prefix: bisect over a SortedKeyList of (casefolded name, id) -> O(log n + limit).
+    Substring: trigram postings, intersected smallest-first, then verified;
+    queries shorter than 3 chars walk the sorted keys and stop at `limit`.
+    """
+    GRAM = 3
+
+    def __init__(self):
+        self._keys = SortedKeyList()          # (casefolded name, id)
+        self._names: Dict[int, str] = {}      # id -> casefolded name
+        self._grams: Dict[str, Set[int]] = {}
+
+    def _grams_of(self, s: str) -> Set[str]:
+        n = self.GRAM
+        return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+    def add(self, ent_id: int, name: str) -> None:
+        key = name.casefold()
+        self._names[ent_id] = key
+        self._keys.add((key, ent_id))
+        for g in self._grams_of(key):
+            self._grams.setdefault(g, set()).add(ent_id)
+
+    def remove(self, ent_id: int) -> None:
+        key = self._names.pop(ent_id, None)
+        if key is None:
+            return
+        self._keys.discard((key, ent_id))
+        for g in self._grams_of(key):
+            ids = self._grams.get(g)
+            if ids is not None:
+                ids.discard(ent_id)
+                if not ids:
+                    del self._grams[g]
+
+    def prefix(self, query: str, limit: int) -> List[int]:
+        """ids whose name starts with `query`, in (name, id) order."""
+        q = query.casefold()
+        hits = takewhile(lambda t: t[0].startswith(q), self._keys.iter_from((q, -_INF)))
+        return [ent_id for (_key, ent_id) in islice(hits, limit)]
+
+    def substring(self, query: str, limit: int) -> List[int]:
+        """ids whose name contains `query`, in (name, id) order."""
+        q = query.casefold()
+        if len(q) < self.GRAM:
+            out = []
+            for key, ent_id in self._keys:
+                if q in key:
+                    out.append(ent_id)
+                    if len(out) >= limit:
+                        break
+            return out
+        postings = []
+        for g in self._grams_of(q):
+            ids = self._grams.get(g)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        cands = set(postings[0])
+        for ids in postings[1:]:
+            cands &= ids
+            if not cands:
+                return []
+        hits = heapq.nsmallest(limit, ((self._names[i], i) for i in cands if q in self._names[i]))
+        return [ent_id for (_key, ent_id) in hits]
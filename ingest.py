@@ -0,0 +1,315 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator, Callable, List, Tuple
+
+from config import ConfigError, load_config_json, validate_visit
+from registry import POIRegistry
+
+# Streaming visit ingestion. One JSON visit object per line, e.g.
+#   {"visitor_id": 1, "poi_id": 1, "date": "01/10/2025", "rating": 7}
+# read from a growing JSONL file, stdin or a local socket.
+#
+#   reader ──> raw queue ──> N validator tasks ──┐
+#      └────> order queue (bounded) ─────────────┴─> committer ──> reg.record_visit
+#
+# Every line gets a future. Validators parse and check lines concurrently and resolve the
+# futures. The committer awaits them in arrival order, so visits land in stream order. It
+# commits a micro-batch once `batch_size` visits are ready or `max_latency` seconds have passed
+# since the batch's first visit arrived. Both queues are bounded: when the registry falls
+# behind, the reader stops reading and the producer (pipe/socket writer) blocks.
+# Bad lines are counted and skipped; they never stop the stream.
+
+_DONE = object()
+
+
+class IngestStats:
+    """Counters for a running ingestor. Lag = time from reading a line to committing it."""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.received = 0
+        self.committed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_error: str | None = None
+        self.queued = 0
+
+    @property
+    def rate(self) -> float:
+        """Committed visits per second since start."""
+        elapsed = time.monotonic() - self.started
+        return self.committed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def lag_avg(self) -> float:
+        return self.lag_total / self.committed if self.committed else 0.0
+
+    def line(self) -> str:
+        return (f"committed={self.committed} rejected={self.rejected} batches={self.batches} "
+                f"rate={self.rate:.0f}/s lag avg={self.lag_avg * 1000:.1f}ms "
+                f"max={self.lag_max * 1000:.1f}ms queued={self.queued}")
+
+
+class VisitIngestor:
+    def __init__(self, reg: POIRegistry, batch_size: int = 500, max_latency: float = 0.05,
+                 queue_size: int = 10000, validators: int = 4,
+                 on_error: Callable[[str], None] | None = None):
+        if batch_size <= 0 or queue_size <= 0 or validators <= 0:
+            raise ValueError("batch_size, queue_size and validators must be positive integers")
+        if max_latency < 0:
+            raise ValueError("max_latency must be non-negative")
+        self.reg = reg
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.queue_size = queue_size
+        self.validators = validators
+        self.on_error = on_error
+        self.stats = IngestStats()
+
+    async def run(self, source: AsyncIterator[bytes | str], report_every: float | None = None,
+                  report: Callable[[IngestStats], None] | None = None) -> IngestStats:
+        """Consume `source` until it ends; returns the final stats.
+        If the reader or the committer fails (e.g. an on_error hook raises), the other stages
+        are cancelled and the error is re-raised here."""
+        self.reg.load_pending_visits()   # a failing lazy loader surfaces here, not mid-stream
+        raw_q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        order_q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.stats = IngestStats()
+        tasks = [asyncio.create_task(self._validate(raw_q)) for _ in range(self.validators)]
+        committer = asyncio.create_task(self._commit(order_q))
+        reader = asyncio.create_task(self._read(source, raw_q, order_q))
+        tasks += [committer, reader]
+        if report_every:
+            tasks.append(asyncio.create_task(self._report(report_every, report or _print_stats)))
+        try:
+            # wait on both: a dead committer would otherwise leave the reader blocked on a full queue
+            done, _pending = await asyncio.wait({reader, committer}, return_when=asyncio.FIRST_EXCEPTION)
+            for t in done:
+                t.result()                       # re-raise the failing stage's error
+            await committer                      # reader finished cleanly: drain the rest
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.stats
+
+    # --- pipeline stages ---
+    async def _read(self, source, raw_q: asyncio.Queue, order_q: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        n = 0
+        async for line in source:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", errors="replace")
+            if not line.strip():
+                continue
+            n += 1
+            fut = loop.create_future()
+            item = (time.monotonic(), n, line, fut)
+            await order_q.put(item)          # backpressure: blocks while the committer lags
+            await raw_q.put(item)
+            self.stats.received += 1
+            self.stats.queued = order_q.qsize()
+        await order_q.put(_DONE)
+
+    async def _validate(self, raw_q: asyncio.Queue) -> None:
+        while True:
+            _ts, n, line, fut = await raw_q.get()
+            try:
+                fut.set_result(validate_visit(json.loads(line), f"line {n}"))
+            except json.JSONDecodeError as e:
+                fut.set_exception(ConfigError(f"line {n}: invalid JSON: {e.msg}"))
+            except ConfigError as e:
+                fut.set_exception(e)
+
+    async def _commit(self, order_q: asyncio.Queue) -> None:
+        done = False
+        while not done:
+            item = await order_q.get()
+            if item is _DONE:
+                return
+            batch = [item]
+            deadline = item[0] + self.max_latency
+            while len(batch) < self.batch_size:
+                if not order_q.empty():
+                    item = order_q.get_nowait()
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    item = await _get_within(order_q, timeout)
+                    if item is None:
+                        break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+            ready = []
+            for ts, n, _line, fut in batch:      # arrival order, whatever order validation finished in
+                await asyncio.wait([fut])
+                ready.append((ts, n, fut.exception() or fut.result()))
+            self._apply(ready)
+            self.stats.queued = order_q.qsize()
+
+    def _apply(self, batch: List[Tuple[float, int, object]]) -> None:
+        st = self.stats
+        for ts, n, visit in batch:
+            if isinstance(visit, Exception):
+                self._reject(str(visit))
+                continue
+            try:
+                self.reg.record_visit(*visit)
+            except (KeyError, ValueError) as e:
+                self._reject(f"line {n}: {e}")
+                continue
+            except Exception as e:               # any other registry failure rejects just this visit
+                self._reject(f"line {n}: {type(e).__name__}: {e}")
+                continue
+            lag = time.monotonic() - ts
+            st.committed += 1
+            st.lag_total += lag
+            if lag > st.lag_max:
+                st.lag_max = lag
+        st.batches += 1
+
+    def _reject(self, msg: str) -> None:
+        self.stats.rejected += 1
+        self.stats.last_error = msg
+        if self.on_error:
+            self.on_error(msg)
+
+    async def _report(self, every: float, report: Callable[[IngestStats], None]) -> None:
+        while True:
+            await asyncio.sleep(every)
+            report(self.stats)
+
+
+async def _get_within(q: asyncio.Queue, timeout: float):
+    # q.get() with a timeout (None when it expires). Unlike wait_for, this never swallows a
+    # cancellation that races with an item arriving, so run() can always stop the committer.
+    get = asyncio.ensure_future(q.get())
+    try:
+        done, _ = await asyncio.wait({get}, timeout=timeout)
+    finally:
+        if not get.done():
+            get.cancel()
+    return get.result() if done else None
+
+
+def _print_stats(stats: IngestStats) -> None:
+    print(stats.line(), file=sys.stderr, flush=True)
+
+
+# --- Sources (async iterators of lines) ---
+async def follow_file(path: str, follow: bool = True, poll: float = 0.2,
+                      stop: asyncio.Event | None = None) -> AsyncIterator[bytes]:
+    """Lines of a JSONL file; with `follow`, keep tailing it as it grows (like `tail -f`).
+    A partial last line is held back until its newline arrives. Truncation restarts at 0."""
+    with open(path, "rb") as f:
+        pending = b""
+        while True:
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith(b"\n"):
+                    yield pending
+                    pending = b""
+                continue
+            if not follow or (stop is not None and stop.is_set()):
+                break
+            if os.path.getsize(path) < f.tell():
+                f.seek(0)
+                pending = b""
+            await asyncio.sleep(poll)
+        if pending:
+            yield pending
+
+async def stdin_lines() -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        yield line
+
+async def socket_lines(address: str, max_pending: int = 1000,
+                       stop: asyncio.Event | None = None) -> AsyncIterator[bytes]:
+    """Lines from every client of a local socket: a unix socket path, or host:port for TCP.
+    Clients stop being read while `max_pending` lines wait, so they block instead of piling up."""
+    lines: asyncio.Queue = asyncio.Queue(max_pending)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await lines.put(line)
+        finally:
+            writer.close()
+
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        server = await asyncio.start_server(handle, host, int(port))
+    else:
+        server = await asyncio.start_unix_server(handle, address)
+    stop = stop or asyncio.Event()
+    try:
+        while not stop.is_set():
+            try:
+                yield await asyncio.wait_for(lines.get(), 0.2)
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Stream visits (JSONL) into a POI registry.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="JSONL file to read")
+    src.add_argument("--stdin", action="store_true", help="read JSONL from stdin")
+    src.add_argument("--socket", help="unix socket path or host:port to listen on")
+    ap.add_argument("--follow", action="store_true", help="keep tailing --file as it grows")
+    ap.add_argument("--config", help="JSON config to preload types/POIs/visitors from")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--max-latency", type=float, default=0.05, help="seconds")
+    ap.add_argument("--queue-size", type=int, default=10000)
+    ap.add_argument("--validators", type=int, default=4)
+    ap.add_argument("--report", type=float, default=1.0, help="stats interval in seconds (0 = off)")
+    args = ap.parse_args(argv)
+
+    reg = POIRegistry()
+    if args.config:
+        try:
+            load_config_json(args.config, reg)
+        except ConfigError as e:
+            print("Config error:", e, file=sys.stderr)
+            return 1
+    ing = VisitIngestor(reg, args.batch_size, args.max_latency, args.queue_size, args.validators)
+    if args.file:
+        source = follow_file(args.file, follow=args.follow)
+    elif args.stdin:
+        source = stdin_lines()
+    else:
+        source = socket_lines(args.socket)
+    try:
+        stats = asyncio.run(ing.run(source, report_every=args.report or None))
+    except KeyboardInterrupt:
+        stats = ing.stats
+    print(stats.line(), file=sys.stderr)
+    if stats.last_error:
+        print("last error:", stats.last_error, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
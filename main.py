@@ -4,6 +4,8 @@
 from models import POIType, POI, Visitor,  is_close #redundand import
 from registry import POIRegistry
 from config import load_config_json, ConfigError
+import export
+from memory import format_report
 
 def prompt_int(msg: str) -> int:
     while True:
@@ -20,6 +22,10 @@ def prompt_str(msg: str) -> str:
             return s
         print("Please enter a non-empty value.")
 
+def prompt_types():
+    raw = input("Only types (comma-separated, blank = all): ").strip()
+    return [t.strip() for t in raw.split(",") if t.strip()] if raw else None
+
 def add_type_menu(reg: POIRegistry):
     name = prompt_str("Type name: ")
     attrs_raw = input("Attributes (comma-separated, optional): ").strip()
@@ -87,7 +93,11 @@ def nearest_k_menu(reg: POIRegistry):
     x = prompt_int("x (0..999): ")
     y = prompt_int("y (0..999): ")
     k = prompt_int("k (>0): ")
-    results = reg.nearest_k(x, y, k)
+    types = prompt_types()
+    try:
+        results = reg.nearest_k(x, y, k, types=types)
+    except KeyError as e:
+        print("Error:", e); return
     for poi, dist in results:
         print(f"Nearest: {poi.name} ({poi.id}) dist={round(dist, 3)}")
 
@@ -200,6 +210,101 @@ def coverage_fairness_menu(reg: POIRegistry):
     for v, pois, types in rows:
         print(f"{v.id}\t{v.name}\tpois={pois}\ttypes={types}")
 
+def top_rated_menu(reg: POIRegistry):
+    k = prompt_int("k (>0): ")
+    rows = reg.top_k_pois_by_rating(k)
+    if not rows:
+        print("No results (need rated visits)."); return
+    for poi, score, cnt in rows:
+        print(f"{poi.id}\t{poi.name}\tscore={round(score, 2)}\t{cnt} ratings")
+
+def rect_counts_menu(reg: POIRegistry):
+    x0 = prompt_int("x0 (0..999): ")
+    y0 = prompt_int("y0 (0..999): ")
+    x1 = prompt_int("x1 (0..999): ")
+    y1 = prompt_int("y1 (0..999): ")
+    tname = input("Type name (blank for all types): ").strip() or None
+    try:
+        pois = reg.count_pois_in_rect(x0, y0, x1, y1, tname)
+    except KeyError as e:
+        print("Error:", e); return
+    visits = reg.count_visits_in_rect(x0, y0, x1, y1)
+    print(f"POIs in box: {pois}\tvisits in box: {visits}")
+
+def parse_value(s: str):
+    # numbers when they look like numbers, otherwise keep the string
+    for conv in (int, float):
+        try:
+            return conv(s)
+        except ValueError:
+            pass
+    return s
+
+def attribute_query_menu(reg: POIRegistry):
+    tname = prompt_str("Type name: ")
+    attr = prompt_str("Attribute: ")
+    op = prompt_str("Operator (==, <, <=, >, >=, between): ")
+    value = parse_value(prompt_str("Value: "))
+    value2 = parse_value(prompt_str("Upper value: ")) if op == "between" else None
+    try:
+        rows = reg.find_pois_by_attribute(tname, attr, op, value, value2)
+    except (KeyError, ValueError) as e:
+        print("Error:", e); return
+    if not rows:
+        print("No matching POIs."); return
+    for poi, val in rows:
+        print(f"{poi.id}\t{poi.name}\t{attr}={val}")
+
+def name_search_menu(reg: POIRegistry):
+    query = prompt_str("Name (or part of it): ")
+    mode = "substring" if prompt_yesno("Match anywhere in the name (not just prefix)?") else "prefix"
+    limit = prompt_int("Max results: ")
+    pois = reg.search_pois_by_name(query, mode, limit)
+    visitors = reg.search_visitors_by_name(query, mode, limit)
+    if not pois and not visitors:
+        print("No matches."); return
+    for p in pois:
+        print(f"POI\t{p.id}\t{p.name}\t{p.poi_type.name}\tcenter={p.coord}")
+    for v in visitors:
+        print(f"Visitor\t{v.id}\t{v.name}\t{v.nationality}")
+
+def co_visited_menu(reg: POIRegistry):
+    pid = prompt_int("POI id: ")
+    n = prompt_int("How many suggestions (>0): ")
+    if not reg.co_visitation_enabled:
+        print("Building co-visitation counts (kept up to date from now on)...")
+        reg.enable_co_visitation()
+    try:
+        rows = reg.co_visited(pid, n)
+    except KeyError as e:
+        print("Error:", e); return
+    if not rows:
+        print("No shared visitors yet."); return
+    for poi, cnt in rows:
+        print(f"{poi.id}\t{poi.name}\t{cnt} shared visitors")
+
+def export_menu(reg: POIRegistry):
+    print("a) distinct visitors per POI  b) visitors for a POI  c) POIs of a type")
+    what = prompt_str("Export which (a/b/c): ").lower()
+    fmt = prompt_str("Format (csv/jsonl): ").lower()
+    path = prompt_str("Output file: ")
+    try:
+        if what == "a":
+            n = export.export_counts_distinct_visitors_per_poi(reg, path, fmt)
+        elif what == "b":
+            pid = prompt_int("POI id: ")
+            n = export.export_visitors_for_poi(reg, pid, path, fmt, prompt_yesno("Distinct visitors only?"))
+        elif what == "c":
+            n = export.export_pois_of_type(reg, prompt_str("Type name: "), path, fmt)
+        else:
+            print("Unknown choice."); return
+        print(f"Exported {n} rows to {path}")
+    except (KeyError, ValueError, OSError) as e:
+        print("Error:", e)
+
+def memory_report_menu(reg: POIRegistry):
+    print(format_report(reg.memory_report()))
+
 #Spatial queries from PQ4
 def within_radius_menu(reg: POIRegistry):
     x = prompt_int("x (0..999): ")
@@ -209,7 +314,11 @@ def within_radius_menu(reg: POIRegistry):
         r = float(r_str)
     except ValueError:
         print("Please enter a number for radius."); return
-    results = reg.within_radius(x, y, r)
+    types = prompt_types()
+    try:
+        results = reg.within_radius(x, y, r, types=types)
+    except KeyError as e:
+        print("Error:", e); return
     if not results:
         print("No POIs within radius.")
         return
@@ -295,6 +404,13 @@ def main():
         "18": ("[Ext] Rename POI type", rename_type_menu),
         "19": ("Delete POI type (only if unused)", delete_type_menu),
         "20": ("Load config from JSON (optional)", load_config_menu),
+        "21": ("Top-k POIs by rating (Bayesian mean)", top_rated_menu),
+        "22": ("Count POIs/visits in a rectangle", rect_counts_menu),
+        "23": ("Find POIs by attribute value", attribute_query_menu),
+        "24": ("Search POIs/visitors by name", name_search_menu),
+        "25": ("Visitors of X also visited...", co_visited_menu),
+        "26": ("Export query results (CSV/JSONL)", export_menu),
+        "27": ("Memory report", memory_report_menu),
         "0": ("Quit", None),
     }
     while True:
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import sys
+import time
+import tracemalloc
+import types
+from array import array
+from typing import List, Set
+
+# Memory accounting for capacity planning.
+# deep_sizeof walks an object graph and adds up sys.getsizeof of everything reachable.
+# Passing one `seen` set across calls charges shared objects (a POI referenced by many
+# visits, an interned name) to the first structure that reaches them, so per-structure
+# numbers add up to the total instead of double counting.
+
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType)
+_LEAF = (str, bytes, bytearray, int, float, complex, bool, type(None), range, memoryview)
+
+
+def deep_sizeof(obj: object, seen: Set[int] | None = None) -> int:
+    """Bytes used by `obj` and everything it references that is not already in `seen`.
+    Functions/classes/modules are not followed (a callback counts as its own object only)."""
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:                                # iterative: visit logs are far deeper than the recursion limit
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, (_LEAF, _OPAQUE, array)):
+            continue                            # arrays report their buffer in getsizeof
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        d = getattr(o, "__dict__", None)
+        if isinstance(d, dict):
+            stack.append(d)
+        for cls in type(o).__mro__:
+            for slot in cls.__dict__.get("__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+
+class IngestProfiler:
+    """tracemalloc around a load, for "how many bytes does one more visit/POI cost?".
+
+        with IngestProfiler() as prof:
+            load_config_json("big.json", reg)
+        print(prof.report(items=number_of_visits))
+
+    Tracing slows Python allocations down noticeably; use it for measurements, not in production.
+    """
+    def __init__(self, top: int = 10, frames: int = 1):
+        self.top = top
+        self.frames = frames
+        self.net_bytes = 0
+        self.peak_bytes = 0
+        self.seconds = 0.0
+        self.top_lines: List[str] = []
+        self._owns_tracing = False
+
+    def __enter__(self) -> "IngestProfiler":
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self._base, _ = tracemalloc.get_traced_memory()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.seconds = time.perf_counter() - self._t0
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        if self._owns_tracing:
+            tracemalloc.stop()
+        self.net_bytes = current - self._base
+        self.peak_bytes = peak - self._base
+        skip = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        stats = after.filter_traces(skip).compare_to(self._before.filter_traces(skip), "lineno")
+        self.top_lines = [str(s) for s in stats[:self.top]]
+        del self._before
+
+    def per_item(self, items: int) -> float:
+        return self.net_bytes / items if items else 0.0
+
+    def report(self, items: int | None = None) -> str:
+        out = [f"net +{self.net_bytes:,} B, peak +{self.peak_bytes:,} B in {self.seconds:.2f}s"]
+        if items:
+            out[0] += f" ({self.per_item(items):,.0f} B per item over {items:,} items)"
+        out += ["  " + line for line in self.top_lines]
+        return "\n".join(out)
+
+
+def format_report(report: dict) -> str:
+    """Human-readable table for POIRegistry.memory_report()."""
+    lines = [f"{name:<22}{size:>14,} B" for name, size in report["structures"].items()]
+    lines.append(f"{'total':<22}{report['total']:>14,} B")
+    c = report["counts"]
+    lines.append(f"per POI {report['per_poi']:,.0f} B ({c['pois']:,}), "
+                 f"per visitor {report['per_visitor']:,.0f} B ({c['visitors']:,}), "
+                 f"per visit {report['per_visit']:,.0f} B ({c['visits']:,})")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] | None = None) -> int:
+    # python memory.py config.json  -> profile the load, then print the registry breakdown
+    from config import ConfigError, load_config_json
+    from registry import POIRegistry
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python memory.py CONFIG.json", file=sys.stderr)
+        return 2
+    reg = POIRegistry()
+    try:
+        with IngestProfiler() as prof:
+            load_config_json(argv[0], reg)
+    except ConfigError as e:
+        print("Config error:", e, file=sys.stderr)
+        return 1
+    report = reg.memory_report()
+    print(format_report(report))
+    print()
+    print("load:", prof.report(items=report["counts"]["visits"] + report["counts"]["pois"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
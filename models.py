@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Dict, List, Tuple
 import math
+import threading
 from datetime import datetime
 
 MAP_SIZE = 1000  # 1000 x 1000 grid fixed
@@ -26,11 +27,40 @@ def _validate_date_ddmmyyyy(s: str) -> str:
     except ValueError:
         raise ValueError("Date must be 'dd/mm/yyyy', e.g., '16/08/2007'")
     
+_MIGRATE_LOCK = threading.Lock()  # only taken on the slow path (a POI behind its type's schema)
+
+def _apply_migrations(values: Dict[str, object], ops: List[Tuple[str, ...]]) -> None:
+    # replay schema changes on one POI's values, same policies as the old eager loops
+    for op in ops:
+        if op[0] == "add":
+            values.setdefault(op[1], None)
+        elif op[0] == "delete":
+            values.pop(op[1], None)
+        elif op[0] == "rename":
+            old, new = op[1], op[2]
+            if old in values:
+                if new not in values:
+                    values[new] = values.pop(old)
+                else:
+                    del values[old]  # policy: keep existing 'new', drop 'old'
+
 class POIType:
-    """Defines a type (e.g., 'forest') and its attribute names."""
-    def __init__(self, name: str, attributes: List[str] | None = None):
+    """Defines a type (e.g., 'forest') and its attribute names.
+    Attribute add/delete/rename are logged in `migrations`; the schema version is the
+    log length and each POI catches up lazily when its values are read.
+    `code` never changes on rename, so bitmasks keyed by it stay valid."""
+    def __init__(self, name: str, attributes: List[str] | None = None, code: int = 0):
         self.name = name
         self.attributes = list(attributes or [])
+        self.code = code  # small integer id (registry-assigned), used as a bit position in type masks
+        self.migrations: List[Tuple[str, ...]] = []  # ("add", a) | ("delete", a) | ("rename", old, new)
+
+    @property
+    def version(self) -> int:
+        return len(self.migrations)
+
+    def record_migration(self, op: str, *args: str) -> None:
+        self.migrations.append((op, *args))
 
     def __str__(self) -> str:
         return f"POIType(name={self.name}, attrs={self.attributes})"
@@ -43,7 +73,7 @@ class POI:
         self._name = name            # immutable by convention
         self._x, self._y = _check_coord(x, y)  # store --->center<---- only
         self.poi_type = poi_type
-        self.values = dict(values or {})  # attribute -> value
+        self.values = dict(values or {})  # attribute -> value (setter stamps the schema version)
 
     # read-only accessors (simple encapsulation)
     @property
@@ -53,6 +83,28 @@ class POI:
     @property
     def coord(self) -> Tuple[int, int]: return (self._x, self._y)
 
+    @property
+    def values(self) -> Dict[str, object]:
+        # resolve against the current type schema on read (O(pending migrations))
+        t = self.poi_type
+        if self._schema_version != t.version:
+            with _MIGRATE_LOCK:
+                # read the target once: a migration appended meanwhile is left for the next read
+                target = t.version
+                if self._schema_version < target:
+                    _apply_migrations(self._values, t.migrations[self._schema_version:target])
+                    self._schema_version = target
+        return self._values
+
+    @values.setter
+    def values(self, values: Dict[str, object]) -> None:
+        self._values = dict(values)
+        self._schema_version = self.poi_type.version
+
+    @property
+    def schema_stale(self) -> bool:
+        return self._schema_version != self.poi_type.version
+
     def distance_to(self, other: "POI") -> float:
         dx = self._x - other._x
         dy = self._y - other._y
@@ -70,6 +122,27 @@ class Visitor:
     def __str__(self) -> str:
         return f"Visitor(id={self.id}, name={self.name}, nationality={self.nationality})"
 
+class RatingStats:
+    """Running sum, count and 1..10 histogram of ratings (updated per visit, never rescanned)."""
+    __slots__ = ("total", "count", "hist")
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.hist = [0] * 10  # hist[r - 1] = how many times rating r was given
+
+    def add(self, rating: int) -> None:
+        self.total += rating
+        self.count += 1
+        self.hist[rating - 1] += 1
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def histogram(self) -> Dict[int, int]:
+        return {r: self.hist[r - 1] for r in range(1, 11)}
+
 class Visit:
     def __init__(self, visitor: "Visitor", poi: "POI", date: str, rating: int | None = None):
         self.visitor = visitor
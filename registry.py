@@ -1,14 +1,64 @@
 from __future__ import annotations
+import functools
 import math
-from typing import Dict, List, Set
+from array import array
+import heapq
+from bisect import bisect_right
+from itertools import chain, islice
+import threading
+import time
+from typing import Callable, Dict, List, Set
 from datetime import datetime
 
 from models import (
-    POIType, POI, Visitor, Visit, DATE_FMT,
+    POIType, POI, Visitor, Visit, RatingStats, DATE_FMT,
     _check_coord, is_close
 )
+from bitmaps import Bitmap
+from covisit import CoVisitation, CSR, co_visitation_csr
+from indexes import AttributeIndex, NameIndex, is_number
+from memory import deep_sizeof
+from sketches import HyperLogLog
+from spatial import (
+    FenwickGrid, KNNGraph, CircleIndex, build_knn_graph, cell_of, iter_bucketed_in_box,
+    iter_pairs_within, ring_search
+)
 
 EPS = 1e-9
+TYPE_CELL = 32  # side of the per-type spatial buckets used by type-filtered queries
+
+
+def _heap_stream(keys: list, emit):
+    # lazy ordered traversal: O(n) heapify, then O(log n) per row actually consumed
+    heapq.heapify(keys)
+    while keys:
+        yield emit(heapq.heappop(keys))
+
+def _keyset_page(keys, after, limit: int, emit):
+    """One page of rows whose sort key is strictly after the cursor `after`.
+    Heap selection keeps it O(n log limit) per page instead of a full O(n log n) sort.
+    Returns (rows, next_cursor); next_cursor is None on the last page."""
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    if after is not None:
+        after = tuple(after)
+        keys = (k for k in keys if k > after)
+    page = heapq.nsmallest(limit, keys)
+    return [emit(k) for k in page], (page[-1] if len(page) == limit else None)
+
+def _needs_visits(method):
+    # visit-based methods first materialize a visits section deferred by
+    # load_config_json(..., lazy_visits=True); a no-op check once visits are loaded
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._pending_visits is not None:
+            self.load_pending_visits()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+def _attr_equal(v: object, value: object) -> bool:
+    # 1 == True in Python; keep numbers and bools apart like the sorted index does
+    return v is not None and v == value and is_number(v) == is_number(value)
 
 
 class POIRegistry:
@@ -17,7 +67,70 @@ class POIRegistry:
         self._pois: Dict[int, POI] = {}        # key: poi_id -> POI
         self._used_poi_ids: set[int] = set()   # enforces “ID non-reuse” (brief)
         self._visitors: Dict[int, Visitor] = {}
-        self._visits: list[Visit] = []
+        # visits are segmented per POI: live analytics only walk the active segments,
+        # delete_poi moves a POI's segment to the archive (history is kept, just out of the way)
+        self._visits_by_poi: Dict[int, list[Visit]] = {}
+        self._archived_visits: Dict[int, list[Visit]] = {}
+        # running rating aggregates, fed by record_visit (no rescans of the visit log)
+        self._poi_ratings: Dict[int, RatingStats] = {}
+        self._type_ratings: Dict[POIType, RatingStats] = {}  # keyed by object so type renames are free
+        self._all_ratings = RatingStats()
+        # distinct ACTIVE POIs per visitor (compressed bitmaps) + "visitors of X also visited Y" counts
+        self._visitor_pois: Dict[int, Bitmap] = {}
+        # distinct ACTIVE types per visitor as a bitmask over POIType.code
+        self._visitor_types: Dict[int, int] = {}
+        self._next_type_code = 0
+        # coverage table: rows (-poi_count, -type_count, id, name, Visitor) in VQ7 order,
+        # rebuilt lazily from the bitmaps/masks after a coverage change (None = stale)
+        self._coverage_rows: list | None = None
+        # opt-in co-visitation counts; _covis is None while disabled
+        self._covis: CoVisitation | None = None
+        self._covis_paused = False  # bulk loads skip incremental upkeep, then rebuild once
+        # opt-in approximate distinct counts (HyperLogLog); _hll_p is None while disabled
+        self._hll_p: int | None = None
+        self._hll_poi_visitors: Dict[int, HyperLogLog] = {}
+        self._hll_visitor_pois: Dict[int, HyperLogLog] = {}
+        self._hll_visitor_types: Dict[int, HyperLogLog] = {}
+        # 2D Fenwick grids: built on first rectangle query, then kept in sync incrementally
+        self._poi_grid: FenwickGrid | None = None
+        self._type_grids: Dict[POIType, FenwickGrid] = {}
+        self._visit_grid: FenwickGrid | None = None
+        # per-type spatial partitions: POIType -> cell -> POIs, kept in sync by add_poi/delete_poi
+        self._type_cells: Dict[POIType, Dict[tuple, List[POI]]] = {}
+        # columnar copy of the active POIs for vectorised consumers (render.py); row order is
+        # arbitrary, delete_poi swaps the last row into the hole so every column stays dense
+        self._col_row: Dict[int, int] = {}  # poi_id -> row
+        self._col_id = array("q")
+        self._col_x = array("i")
+        self._col_y = array("i")
+        self._col_code = array("i")
+        self._col_visits = array("i")       # active visits per POI
+        # flat visit log for bulk analytics (analytics.py): one row per recorded visit, archived
+        # ones included; a row is archived once its POI is deleted (POI ids are never reused)
+        self._vcol_visitor = array("q")
+        self._vcol_poi = array("q")
+        self._vcol_code = array("q")
+        # bumped on every add_poi/delete_poi so batch results can be cached safely
+        self._poi_version = 0
+        self._knn_cache: tuple[int, KNNGraph] | None = None  # (version, graph)
+        # sliced schema compaction: bumped on every attribute migration; one resumable pass of
+        # POI ids per type filter (None = all types) -> (remaining ids, _schema_gen at pass start)
+        self._schema_gen = 0
+        self._compact_passes: Dict[POIType | None, tuple] = {}
+        # optional secondary indexes: POIType -> attr -> AttributeIndex
+        self._attr_indexes: Dict[POIType, Dict[str, AttributeIndex]] = {}
+        # name search (prefix / substring) without scanning _pois or _visitors
+        self._poi_names = NameIndex()
+        self._visitor_names = NameIndex()
+        # lazily loaded visits: a loader that records them on first visit-based use (None = loaded)
+        self._pending_visits: Callable[["POIRegistry"], None] | None = None
+        # standing within_radius subscriptions: sub_id -> (x, y, r, callback, on_error), found by grid cell
+        self._subs: Dict[int, tuple] = {}
+        self._sub_index = CircleIndex()
+        self._next_sub_id = 1
+        # callback failures are counted, never raised into add_poi/delete_poi
+        self.subscription_errors = 0
+        self.last_subscription_error: tuple[int, Exception] | None = None  # (sub_id, error)
 
     # --- Types ---
     def add_type(self, name: str, attributes: List[str] | None = None) -> POIType:
@@ -26,7 +139,8 @@ class POIRegistry:
             raise ValueError("Type name cannot be empty(Come on, you can do better than this!)")
         if key in self._types:
             raise ValueError(f"POI type '{name}' already exists!!!")
-        t = POIType(name=key, attributes=list(attributes or []))
+        t = POIType(name=key, attributes=list(attributes or []), code=self._next_type_code)
+        self._next_type_code += 1
         self._types[key] = t
         return t
 
@@ -39,14 +153,44 @@ class POIRegistry:
         if any(p.poi_type is t for p in self._pois.values()):
             raise ValueError(f"Cannot delete type '{name}': this type is used by existing POIs")
         del self._types[key]
+        self._type_cells.pop(t, None)
+        self._type_grids.pop(t, None)
+        self._attr_indexes.pop(t, None)
         return True
 
     def list_types(self) -> List[str]:
         return sorted(self._types.keys())
+
+    def type_attributes(self, type_name: str) -> List[str]:
+        t = self._types.get(type_name.strip().lower())
+        if not t:
+            raise KeyError(f"Unknown POI type '{type_name}'")
+        return list(t.attributes)
     
-    def nearest_k(self, x: int, y: int, k: int):
+    def _resolve_types(self, types) -> List[POIType]:
+        # types= filter: one name or an iterable of names, case-insensitive
+        if isinstance(types, str):
+            types = [types]
+        out: List[POIType] = []
+        for name in types:
+            t = self._types.get(name.strip().lower())
+            if t is None:
+                raise KeyError(f"Unknown POI type '{name}'")
+            if t not in out:
+                out.append(t)
+        return out
+
+    def nearest_k(self, x: int, y: int, k: int, types=None):
         # PQ5: k POIs closest to c0 = (x, y) by Euclidean distance
         x, y = _check_coord(x, y)           # grid is 1000x1000, integer coords
+        if types is not None:
+            wanted = self._resolve_types(types)
+            if k <= 0:
+                return []
+            # ring search inside each requested type's partition, then merge the sorted heads
+            parts = [ring_search(self._type_cells.get(t, {}), TYPE_CELL, x, y, k) for t in wanted]
+            merged = heapq.merge(*parts, key=lambda t: (t[0], t[1], t[2]))
+            return [(p, d) for (d, _id, _name, p) in islice(merged, k)]
         if k <= 0:
             return []
         items = []
@@ -57,13 +201,22 @@ class POIRegistry:
         items.sort(key=lambda t: (t[0], t[1], t[2]))  # expectable tie-break: distance, id, name
         return [(p, d) for (d, _id, _name, p) in items[:k]]
     
-    def within_radius(self, x: int, y: int, r: float):
+    def within_radius(self, x: int, y: int, r: float, types=None):
         # PQ4: POIs with distance <= r from (x, y), using epsilon-aware comparison
         x, y = _check_coord(x, y)
-        if r < 0:
+        if types is not None:
+            wanted = self._resolve_types(types)
+        if r < 0 or math.isnan(r):               # nan matches nothing (every comparison is False)
             return []
+        if types is not None:
+            pois = chain.from_iterable(
+                iter_bucketed_in_box(self._type_cells.get(t, {}), TYPE_CELL,
+                                     x - r - EPS, y - r - EPS, x + r + EPS, y + r + EPS)
+                for t in wanted)
+        else:
+            pois = self._pois.values()
         items = []
-        for p in self._pois.values():
+        for p in pois:
             px, py = p.coord
             d = math.hypot(px - x, py - y)
             if d < r or is_close(d, r):          # include boundary
@@ -96,17 +249,179 @@ class POIRegistry:
         p = POI(poi_id, name, t, x, y, values)
         self._pois[p.id] = p
         self._used_poi_ids.add(p.id)
+        self._poi_version += 1
+        self._poi_names.add(p.id, p.name)
+        self._type_cells.setdefault(t, {}).setdefault(cell_of(x, y, TYPE_CELL), []).append(p)
+        self._col_row[p.id] = len(self._col_id)
+        self._col_id.append(p.id)
+        self._col_x.append(x)
+        self._col_y.append(y)
+        self._col_code.append(t.code)
+        self._col_visits.append(0)
+        if self._poi_grid is not None:
+            self._poi_grid.add(x, y)
+        if t in self._type_grids:
+            self._type_grids[t].add(x, y)
+        for attr, idx in self._attr_indexes.get(t, {}).items():
+            idx.add(p.id, p.values.get(attr))
+        if self._subs:
+            self._notify("add", p)
         return p
 
     def list_pois(self) -> List[POI]:
         return list(self._pois.values())
+
+    def get_poi(self, poi_id: int) -> POI | None:
+        return self._pois.get(poi_id)
     
     # ---------- Delete POI Bug Fix ----------
+    @_needs_visits
     def delete_poi(self, poi_id: int) -> bool:
         """Remove a POI from the active registry. ID remains reserved (no reuse).
         Past Visit objects remain as historical records."""
         p = self._pois.pop(poi_id, None)
-        return p is not None
+        if p is None:
+            return False
+        self._poi_version += 1
+        self._poi_names.remove(p.id)
+        x, y = p.coord
+        cells = self._type_cells[p.poi_type]
+        key = cell_of(x, y, TYPE_CELL)
+        cells[key].remove(p)
+        if not cells[key]:
+            del cells[key]
+        self._drop_column_row(p.id)
+        if self._poi_grid is not None:
+            self._poi_grid.add(x, y, -1)
+        if p.poi_type in self._type_grids:
+            self._type_grids[p.poi_type].add(x, y, -1)
+        for attr, idx in self._attr_indexes.get(p.poi_type, {}).items():
+            idx.remove(p.id, p.values.get(attr))
+        seg = self._visits_by_poi.pop(p.id, None)
+        if seg:
+            self._archived_visits[p.id] = seg
+            for vid in {vis.visitor.id for vis in seg}:
+                remaining = self._visitor_pois[vid]
+                remaining.discard(p.id)
+                mask = 0
+                for pid in remaining:  # the type bit stays only if another active POI has it
+                    mask |= 1 << self._pois[pid].poi_type.code
+                self._visitor_types[vid] = mask
+            self._coverage_rows = None
+        if self._covis is not None:
+            self._covis.drop(p.id)
+        self._hll_poi_visitors.pop(p.id, None)
+        if self._subs:
+            self._notify("remove", p)
+        return True
+
+    # ---------- Standing spatial subscriptions (continuous within_radius) ----------
+    def subscribe_radius(self, x: int, y: int, r: float, callback,
+                         on_error: Callable[[int, Exception], None] | None = None) -> tuple[int, list]:
+        """Watch the circle (x, y, r): callback(event, poi, distance) is called with
+        event "add" / "remove" whenever add_poi / delete_poi changes within_radius(x, y, r).
+        If callback raises, the error is recorded (subscription_errors, last_subscription_error)
+        and passed to on_error(sub_id, error); it never propagates into the mutation.
+        Returns (sub_id, current within_radius result) so the caller starts in sync."""
+        x, y = _check_coord(x, y)
+        if r < 0 or math.isnan(r):
+            raise ValueError("Radius must be a non-negative number (not nan)")
+        if not callable(callback) or (on_error is not None and not callable(on_error)):
+            raise ValueError("callback and on_error must be callable")
+        sub_id = self._next_sub_id
+        self._next_sub_id += 1
+        self._sub_index.add(sub_id, x, y, r)         # index first: a failure leaves no dangling sub
+        self._subs[sub_id] = (x, y, r, callback, on_error)
+        return sub_id, self.within_radius(x, y, r)
+
+    def unsubscribe(self, sub_id: int) -> bool:
+        if self._subs.pop(sub_id, None) is None:
+            return False
+        self._sub_index.remove(sub_id)
+        return True
+
+    def _notify(self, event: str, p: POI) -> None:
+        # only circles registered in the POI's grid cell can contain it
+        px, py = p.coord
+        for sub_id in sorted(self._sub_index.candidates(px, py)):
+            x, y, r, callback, on_error = self._subs[sub_id]
+            d = math.hypot(px - x, py - y)
+            if d < r or is_close(d, r):          # same boundary rule as within_radius
+                try:
+                    callback(event, p, d)
+                except Exception as e:       # the mutation is already applied: record, don't raise
+                    self.subscription_errors += 1
+                    self.last_subscription_error = (sub_id, e)
+                    if on_error is not None:
+                        on_error(sub_id, e)
+
+    def _drop_column_row(self, poi_id: int) -> None:
+        row, last = self._col_row.pop(poi_id), len(self._col_id) - 1
+        cols = (self._col_id, self._col_x, self._col_y, self._col_code, self._col_visits)
+        if row != last:
+            for col in cols:
+                col[row] = col[last]
+            self._col_row[self._col_id[row]] = row
+        for col in cols:
+            col.pop()
+
+    @_needs_visits
+    def coordinate_arrays(self) -> tuple[array, array, array, array, array]:
+        """Columns (ids, xs, ys, type codes, active visit counts) of the active POIs, one row
+        per POI in no particular order. These are the live arrays: copy them (np.array(col))
+        before the registry changes again, and don't keep buffer views across mutations."""
+        return self._col_id, self._col_x, self._col_y, self._col_code, self._col_visits
+
+    @_needs_visits
+    def visit_columns(self) -> tuple[array, array, array]:
+        """Columns (visitor ids, poi ids, type codes) with one row per recorded visit, archived
+        visits included, in record order; rows whose poi id is in deleted_poi_ids() are archived.
+        Live arrays, like coordinate_arrays(): copy them before the registry changes again."""
+        return self._vcol_visitor, self._vcol_poi, self._vcol_code
+
+    def deleted_poi_ids(self) -> set[int]:
+        return self._used_poi_ids - self._pois.keys()
+
+    def type_codes(self) -> Dict[str, int]:
+        """type name -> POIType.code (the values in coordinate_arrays' type column)."""
+        return {name: t.code for name, t in self._types.items()}
+
+    # ---------- Lazy visits ----------
+    def defer_visits(self, loader: Callable[["POIRegistry"], None]) -> None:
+        """Register loader(reg) to record the visits later; it runs once, right before the first
+        visit-based query, record_visit or delete_poi (or an explicit load_pending_visits).
+        A loader that is still pending is kept: the two run in registration order."""
+        prev = self._pending_visits
+        if prev is None:
+            self._pending_visits = loader
+            return
+
+        def chained(reg: "POIRegistry") -> None:
+            prev(reg)
+            loader(reg)
+        self._pending_visits = chained
+
+    @property
+    def visits_loaded(self) -> bool:
+        return self._pending_visits is None
+
+    def load_pending_visits(self) -> None:
+        loader, self._pending_visits = self._pending_visits, None  # cleared first: the loader calls record_visit
+        if loader is not None:
+            loader(self)
+
+    @_needs_visits
+    def iter_visit_keys(self, include_archived: bool = False):
+        """Yield (visitor_id, poi_id, type_name) per visit — a flat view for bulk analytics."""
+        for vis in self._iter_visits(include_archived):
+            yield vis.visitor.id, vis.poi.id, vis.poi.poi_type.name
+
+    def _iter_visits(self, include_archived: bool = False):
+        """All visits to active POIs; visits to deleted POIs too when include_archived."""
+        active = chain.from_iterable(self._visits_by_poi.values())
+        if not include_archived:
+            return active
+        return chain(active, chain.from_iterable(self._archived_visits.values()))
 
     # --- Visitors & Visits ---
     # --- Visitors ---
@@ -115,9 +430,34 @@ class POIRegistry:
             raise ValueError(f"Visitor id {visitor_id} already exists")
         v = Visitor(visitor_id, name, nationality)
         self._visitors[visitor_id] = v
+        self._visitor_names.add(v.id, v.name)
+        self._coverage_rows = None
         return v
 
+    def list_visitors(self) -> List[Visitor]:
+        return list(self._visitors.values())
+
+    # --- Name search ---
+    def _name_search(self, index: NameIndex, query: str, mode: str, limit: int) -> List[int]:
+        if limit <= 0:
+            return []
+        if mode == "prefix":
+            return index.prefix(query.strip(), limit)
+        if mode == "substring":
+            return index.substring(query.strip(), limit)
+        raise ValueError("mode must be 'prefix' or 'substring'")
+
+    def search_pois_by_name(self, query: str, mode: str = "prefix", limit: int = 20) -> List[POI]:
+        """Active POIs whose name starts with (mode='prefix') or contains (mode='substring')
+        `query`, case-insensitive, in name A→Z then id order, at most `limit` rows."""
+        return [self._pois[pid] for pid in self._name_search(self._poi_names, query, mode, limit)]
+
+    def search_visitors_by_name(self, query: str, mode: str = "prefix", limit: int = 20) -> List[Visitor]:
+        """Same as search_pois_by_name, for visitors."""
+        return [self._visitors[vid] for vid in self._name_search(self._visitor_names, query, mode, limit)]
+
     # --- Visits ---
+    @_needs_visits
     def record_visit(self, visitor_id: int, poi_id: int, date: str, rating: float | None = None) -> Visit:
         v = self._visitors.get(visitor_id)
         if v is None:
@@ -135,40 +475,55 @@ class POIRegistry:
                 raise ValueError("Rating must be an integer 1..10")
             if not (1 <= rating <= 10):
                 raise ValueError("Rating must be an integer 1..10")
-        self._visits.append(visit)
+        self._visits_by_poi.setdefault(p.id, []).append(visit)
+        self._col_visits[self._col_row[p.id]] += 1
+        self._vcol_visitor.append(v.id)
+        self._vcol_poi.append(p.id)
+        self._vcol_code.append(p.poi_type.code)
+        seen = self._visitor_pois.get(v.id)
+        if seen is None:
+            seen = self._visitor_pois[v.id] = Bitmap()
+        if p.id not in seen:
+            if self._covis is not None and not self._covis_paused:
+                self._covis.add_first_visit(p.id, seen)
+            seen.add(p.id)
+            self._visitor_types[v.id] = self._visitor_types.get(v.id, 0) | 1 << p.poi_type.code
+            self._coverage_rows = None
+        if self._hll_p is not None:
+            self._sketch_visit(v.id, p)
+        if self._visit_grid is not None:
+            self._visit_grid.add(*p.coord)
+        if rating is not None:
+            self._poi_ratings.setdefault(p.id, RatingStats()).add(rating)
+            self._type_ratings.setdefault(p.poi_type, RatingStats()).add(rating)
+            self._all_ratings.add(rating)
         return visit
 
+    @_needs_visits
     def top_k_pois_by_distinct_visitors(self, k: int):
         """Return [(POI, distinct_visitor_count)] for the top-k POIs.
         Tie-breaks: higher count first, then lower id, then name A→Z, errored multiple times...
         """
         if k <= 0:
             return []
-        # Build poi_id -> set(visitor_ids) for DISTINCT!!! counting by convention
-        distinct: Dict[int, set[int]] = {}
-        for vis in self._visits:
-            pid = vis.poi.id
-            vid = vis.visitor.id
-            distinct.setdefault(pid, set()).add(vid)
-
+        # DISTINCT!!! visitors per POI, by convention; only active segments are walked
         rows = []
-        for pid, vids in distinct.items():
-            p = self._pois.get(pid)
-            if p is None:
-                continue
-            cnt = len(vids)
+        for pid, seg in self._visits_by_poi.items():
+            p = self._pois[pid]
+            cnt = len({vis.visitor.id for vis in seg})
             # sort by (-cnt, id, name) so largest first, deterministic ties
             rows.append((-cnt, p.id, p.name, p, cnt))
 
         rows.sort(key=lambda t: (t[0], t[1], t[2]))
         return [(p, cnt) for (_nc, _id, _nm, p, cnt) in rows[:k]]
 
-    def top_k_visitors_by_distinct_pois(self, k: int):
-        #same rules as above, but for visitors
+    @_needs_visits
+    def top_k_visitors_by_distinct_pois(self, k: int, include_archived: bool = False):
+        #same rules as above, but for visitors (deleted POIs only count when include_archived)
         if k <= 0:
             return []
         distinct: Dict[int, set[int]] = {}
-        for vis in self._visits:
+        for vis in self._iter_visits(include_archived):
             vid = vis.visitor.id
             pid = vis.poi.id
             distinct.setdefault(vid, set()).add(pid)
@@ -185,9 +540,269 @@ class POIRegistry:
         return [(v, cnt) for (_nc, _id, _nm, v, cnt) in rows[:k]]
 
 
+    # ---------- Ratings (incremental aggregates) ----------
+    @_needs_visits
+    def average_rating_for_poi(self, poi_id: int) -> float | None:
+        """Mean rating of a POI, or None if it was never rated."""
+        if poi_id not in self._pois:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        st = self._poi_ratings.get(poi_id)
+        return st.mean if st else None
+
+    @_needs_visits
+    def rating_histogram(self, poi_id: int) -> Dict[int, int]:
+        """Return {rating: count} for ratings 1..10 of a POI (zeros included)."""
+        if poi_id not in self._pois:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        return self._poi_ratings.get(poi_id, RatingStats()).histogram()
+
+    @_needs_visits
+    def type_rating_histogram(self, type_name: str) -> Dict[int, int]:
+        """Return {rating: count} over every rated visit to POIs of that type."""
+        t = self._types.get(type_name.strip().lower())
+        if not t:
+            raise KeyError(f"Unknown POI type '{type_name}'")
+        return self._type_ratings.get(t, RatingStats()).histogram()
+
+    @_needs_visits
+    def average_rating_per_type(self):
+        """Return [(type_name, mean or None, rating_count)] for every known type.
+        Rated types first by mean desc, then name; unrated types last by name.
+        """
+        rows = []
+        for name, t in self._types.items():
+            st = self._type_ratings.get(t)
+            cnt = st.count if st else 0
+            mean = st.mean if st else None
+            rows.append((cnt == 0, -(mean or 0.0), name, mean, cnt))
+        rows.sort(key=lambda r: (r[0], r[1], r[2]))
+        return [(name, mean, cnt) for (_unrated, _nm, name, mean, cnt) in rows]
+
+    @_needs_visits
+    def top_k_pois_by_rating(self, k: int, prior_weight: float = 5.0):
+        """Return [(POI, bayesian_mean, rating_count)] for the top-k rated POIs.
+        Bayesian mean = (C*m + sum) / (C + n), with m the global mean rating and
+        C = prior_weight, so a single 10/10 does not beat fifty 9/10s.
+        Tie-breaks: higher score first, then lower id, then name A→Z.
+        """
+        if k <= 0 or self._all_ratings.count == 0:
+            return []
+        if prior_weight < 0:
+            raise ValueError("prior_weight must be non-negative")
+        m = self._all_ratings.mean
+        rows = []
+        for pid, st in self._poi_ratings.items():
+            p = self._pois.get(pid)
+            if p is None:
+                continue
+            score = (prior_weight * m + st.total) / (prior_weight + st.count)
+            rows.append((-score, p.id, p.name, p, score, st.count))
+        best = heapq.nsmallest(k, rows, key=lambda t: (t[0], t[1], t[2]))
+        return [(p, score, cnt) for (_ns, _id, _nm, p, score, cnt) in best]
+
+    # ---------- Co-visitation: "visitors of X also visited Y" ----------
+    @_needs_visits
+    def co_visited(self, poi_id: int, n: int):
+        """Return [(POI, shared_visitors)] for the top-n other active POIs sharing the most
+        DISTINCT visitors with `poi_id`. Tie-breaks: higher count, lower id, name A→Z.
+        Needs enable_co_visitation()."""
+        if self._covis is None:
+            raise ValueError("Co-visitation is off; call enable_co_visitation() first")
+        if poi_id not in self._pois:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        if n <= 0:
+            return []
+        if self._covis_paused:
+            self.rebuild_co_visitation()
+        rows = []
+        for qid, cnt in self._covis.row(poi_id).items():
+            q = self._pois.get(qid)
+            if q is not None:
+                rows.append((-cnt, q.id, q.name, q, cnt))
+        best = heapq.nsmallest(n, rows, key=lambda t: (t[0], t[1], t[2]))
+        return [(q, cnt) for (_nc, _id, _nm, q, cnt) in best]
+
+    @_needs_visits
+    def enable_co_visitation(self) -> None:
+        """Keep "visitors of X also visited Y" counts, built from the active visits in one
+        bulk pass and then updated by record_visit/delete_poi. Off by default: the counts
+        grow with the sum of squared distinct POIs per visitor."""
+        self._covis = CoVisitation(self.co_visitation_csr())
+        self._covis_paused = False
+
+    def disable_co_visitation(self) -> None:
+        self._covis = None
+        self._covis_paused = False
+
+    @property
+    def co_visitation_enabled(self) -> bool:
+        return self._covis is not None
+
+    def pause_co_visitation(self) -> None:
+        """Stop incremental co-visitation upkeep (e.g., during a large backfill).
+        The next co_visited() call, or rebuild_co_visitation(), rebuilds it in bulk."""
+        self._covis_paused = True
+
+    @_needs_visits
+    def co_visitation_csr(self) -> CSR:
+        """Co-visitation matrix as CSR arrays (poi_ids, indptr, indices, data)."""
+        return co_visitation_csr(self._visitor_pois)
+
+    def rebuild_co_visitation(self) -> None:
+        """Recompute all co-visitation counts in one sparse AᵀA pass and resume upkeep."""
+        if self._covis is None:
+            raise ValueError("Co-visitation is off; call enable_co_visitation() first")
+        self._covis = CoVisitation(self.co_visitation_csr())
+        self._covis_paused = False
+
+    # ---------- Approximate distinct counting (HyperLogLog) ----------
+    @_needs_visits
+    def enable_approximate_distinct(self, precision: int = 12) -> None:
+        """Keep a HyperLogLog sketch per POI (distinct visitors) and per visitor
+        (distinct POIs, distinct types), seeded from the active visits.
+        Relative standard error ~1.04/sqrt(2**precision) (1.6% at 12), at most
+        2**precision bytes per sketch; small sets stay sparse and much smaller.
+        Sketches only grow: visitor sketches keep POIs that are later deleted."""
+        HyperLogLog(precision)  # validates precision
+        self._hll_p = precision
+        self._hll_poi_visitors, self._hll_visitor_pois, self._hll_visitor_types = {}, {}, {}
+        for vis in self._iter_visits():
+            self._sketch_visit(vis.visitor.id, vis.poi)
+
+    def disable_approximate_distinct(self) -> None:
+        self._hll_p = None
+        self._hll_poi_visitors, self._hll_visitor_pois, self._hll_visitor_types = {}, {}, {}
+
+    def _sketch_visit(self, visitor_id: int, p: POI) -> None:
+        prec = self._hll_p
+        self._hll_poi_visitors.setdefault(p.id, HyperLogLog(prec)).add(visitor_id)
+        self._hll_visitor_pois.setdefault(visitor_id, HyperLogLog(prec)).add(p.id)
+        # hash the type's stable code rather than its name, so type renames don't split counts
+        self._hll_visitor_types.setdefault(visitor_id, HyperLogLog(prec)).add(p.poi_type.code)
+
+    def _require_sketches(self) -> None:
+        if self._hll_p is None:
+            raise ValueError("Approximate mode is off; call enable_approximate_distinct() first")
+
+    @_needs_visits
+    def approx_distinct_visitors(self, poi_id: int) -> int:
+        self._require_sketches()
+        if poi_id not in self._pois:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        sk = self._hll_poi_visitors.get(poi_id)
+        return sk.count() if sk is not None else 0
+
+    @_needs_visits
+    def approx_distinct_pois(self, visitor_id: int) -> int:
+        self._require_sketches()
+        if visitor_id not in self._visitors:
+            raise KeyError(f"Unknown visitor id {visitor_id}")
+        sk = self._hll_visitor_pois.get(visitor_id)
+        return sk.count() if sk is not None else 0
+
+    @_needs_visits
+    def approx_distinct_types(self, visitor_id: int) -> int:
+        self._require_sketches()
+        if visitor_id not in self._visitors:
+            raise KeyError(f"Unknown visitor id {visitor_id}")
+        sk = self._hll_visitor_types.get(visitor_id)
+        return sk.count() if sk is not None else 0
+
+    @_needs_visits
+    def approx_union_visitors(self, poi_ids: List[int]) -> int:
+        """Approximate distinct visitors across several POIs (sketches merged, not rescanned)."""
+        self._require_sketches()
+        acc = HyperLogLog(self._hll_p)
+        for pid in poi_ids:
+            if pid not in self._pois:
+                raise KeyError(f"Unknown poi id {pid}")
+            sk = self._hll_poi_visitors.get(pid)
+            if sk is not None:
+                acc.merge(sk)
+        return acc.count()
+
+    @_needs_visits
+    def approx_counts_distinct_visitors_per_poi(self):
+        """Like counts_distinct_visitors_per_poi, from sketches: [(POI, ~count)]."""
+        self._require_sketches()
+        rows = []
+        for pid, p in self._pois.items():
+            sk = self._hll_poi_visitors.get(pid)
+            cnt = sk.count() if sk is not None else 0
+            rows.append((-cnt, p.id, p.name, p, cnt))
+        rows.sort(key=lambda t: (t[0], t[1], t[2]))
+        return [(p, cnt) for (_nc, _id, _nm, p, cnt) in rows]
+
+    @_needs_visits
+    def approx_visitors_meeting_coverage(self, m: int, t: int):
+        """Like visitors_meeting_coverage, from sketches: [(Visitor, ~pois, ~types)]."""
+        self._require_sketches()
+        if m < 0 or t < 0:
+            raise ValueError("m and t must be non-negative integers")
+        rows = []
+        for vid, v in self._visitors.items():
+            sp, st = self._hll_visitor_pois.get(vid), self._hll_visitor_types.get(vid)
+            pois = sp.count() if sp else 0
+            types = st.count() if st else 0
+            if pois >= m and types >= t:
+                rows.append((-pois, -types, v.id, v.name, v, pois, types))
+        rows.sort(key=lambda r: (r[0], r[1], r[2], r[3]))
+        return [(v, pois, types) for (_np, _nt, _id, _nm, v, pois, types) in rows]
+
+    @_needs_visits
     def get_poi_visit_count(self, poi_id: int) -> int:
-        return sum(1 for vis in self._visits if vis.poi.id == poi_id)
+        # works for deleted POIs too (their visits are archived, not dropped)
+        seg = self._visits_by_poi.get(poi_id)
+        if seg is None:
+            seg = self._archived_visits.get(poi_id, ())
+        return len(seg)
    
+    # ---------- Rectangle counts (2D Fenwick grids, O(log^2) per query and update) ----------
+    def _pois_table(self, t: POIType | None = None) -> FenwickGrid:
+        if t is None:
+            if self._poi_grid is None:
+                self._poi_grid = FenwickGrid.from_points(p.coord for p in self._pois.values())
+            return self._poi_grid
+        grid = self._type_grids.get(t)
+        if grid is None:
+            grid = FenwickGrid.from_points(p.coord for p in self._pois.values() if p.poi_type is t)
+            self._type_grids[t] = grid
+        return grid
+
+    def _visits_table(self) -> FenwickGrid:
+        if self._visit_grid is None:
+            # visit volume can outgrow 32 bits
+            self._visit_grid = FenwickGrid.from_points(
+                (vis.poi.coord for vis in self._iter_visits(include_archived=True)), typecode="q")
+        return self._visit_grid
+
+    def count_pois_in_rect(self, x0: int, y0: int, x1: int, y1: int,
+                           type_name: str | None = None) -> int:
+        """Number of active POIs whose center lies in the inclusive box [x0..x1] x [y0..y1].
+        The box is clipped to the grid; pass type_name to count a single type."""
+        t = None
+        if type_name is not None:
+            t = self._types.get(type_name.strip().lower())
+            if not t:
+                raise KeyError(f"Unknown POI type '{type_name}'")
+        return self._pois_table(t).rect_sum(x0, y0, x1, y1)
+
+    @_needs_visits
+    def count_visits_in_rect(self, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Number of recorded visits (deleted POIs included, visits are history)
+        to POIs centered in the inclusive box [x0..x1] x [y0..y1]."""
+        return self._visits_table().rect_sum(x0, y0, x1, y1)
+
+    @_needs_visits
+    def density_heatmap(self, cell: int = 50, source: str = "pois") -> List[List[int]]:
+        """Downsampled density grid: entry [row][col] counts POIs (or visits) in the
+        cell x cell block starting at (col*cell, row*cell)."""
+        if source == "pois":
+            return self._pois_table().heatmap(cell)
+        if source == "visits":
+            return self._visits_table().heatmap(cell)
+        raise ValueError("source must be 'pois' or 'visits'")
+
     # ---------- Attributes on a POI type ----------
     def add_attribute_to_type(self, type_name: str, attr_name: str) -> None:
         key = type_name.strip().lower()
@@ -200,10 +815,9 @@ class POIRegistry:
         if attr in t.attributes:
             raise ValueError(f"Attribute '{attr}' already exists on type '{type_name}'")
         t.attributes.append(attr)
-        # migrate existing POIs of this type: default None
-        for p in self._pois.values():
-            if p.poi_type is t and attr not in p.values:
-                p.values[attr] = None
+        # existing POIs of this type pick up the default None lazily on read
+        t.record_migration("add", attr)
+        self._schema_gen += 1
 
     def delete_attribute_from_type(self, type_name: str, attr_name: str) -> bool:
         key = type_name.strip().lower()
@@ -214,27 +828,146 @@ class POIRegistry:
         if attr not in t.attributes:
             return False
         t.attributes.remove(attr)
-        # migrate existing POIs of this type: drop the key
-        for p in self._pois.values():
-            if p.poi_type is t and attr in p.values:
-                del p.values[attr]
+        # existing POIs of this type drop the key lazily on read
+        t.record_migration("delete", attr)
+        self._schema_gen += 1
+        self._attr_indexes.get(t, {}).pop(attr, None)
         return True
 
+    # ---------- Secondary indexes on attribute values ----------
+    def _type_attr(self, type_name: str, attr_name: str) -> tuple[POIType, str]:
+        t = self._types.get(type_name.strip().lower())
+        if not t:
+            raise KeyError(f"Unknown POI type '{type_name}'")
+        attr = attr_name.strip()
+        if attr not in t.attributes:
+            raise KeyError(f"Attribute '{attr}' not on type '{type_name}'")
+        return t, attr
+
+    def _build_attr_index(self, t: POIType, attr: str, kind: str) -> AttributeIndex:
+        idx = AttributeIndex(kind)
+        for p in self._pois.values():
+            if p.poi_type is t:
+                idx.add(p.id, p.values.get(attr))
+        self._attr_indexes.setdefault(t, {})[attr] = idx
+        return idx
+
+    def _attr_index(self, t: POIType, attr: str) -> AttributeIndex | None:
+        idx = self._attr_indexes.get(t, {}).get(attr)
+        if idx is not None and idx.stale:
+            idx = self._build_attr_index(t, attr, idx.kind)
+        return idx
+
+    def create_attribute_index(self, type_name: str, attr_name: str, kind: str = "sorted") -> None:
+        """Index one attribute of one type. kind='sorted' (numeric ranges + equality)
+        or 'hash' (equality on any hashable value). Replaces an existing index."""
+        t, attr = self._type_attr(type_name, attr_name)
+        self._build_attr_index(t, attr, kind)
+
+    def drop_attribute_index(self, type_name: str, attr_name: str) -> bool:
+        t = self._types.get(type_name.strip().lower())
+        if not t:
+            return False
+        return self._attr_indexes.get(t, {}).pop(attr_name.strip(), None) is not None
+
+    def set_poi_value(self, poi_id: int, attr_name: str, value: object) -> None:
+        """Set one attribute value on a POI, keeping attribute indexes current.
+        (Writing p.values[...] directly bypasses the indexes.)"""
+        p = self._pois.get(poi_id)
+        if p is None:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        t, attr = self._type_attr(p.poi_type.name, attr_name)
+        idx = self._attr_indexes.get(t, {}).get(attr)
+        if idx is not None and not idx.stale:
+            idx.remove(p.id, p.values.get(attr))
+            idx.add(p.id, value)
+        p.values[attr] = value
+
+    def find_pois_by_attribute(self, type_name: str, attr_name: str, op: str,
+                               value: object, value2: object | None = None):
+        """Return [(POI, value)] for POIs of a type whose attribute matches, e.g.
+        ('museum', 'tickets', '<', 15) or ('viewpoint', 'elevation', 'between', 200, 300).
+        op: '==', '<', '<=', '>', '>=', 'between' (inclusive). Range ops only match
+        numeric values. Order: (value, id); for '==' by id.
+        Uses an index from create_attribute_index when one fits (O(log n + hits)),
+        otherwise scans the POIs of the type.
+        """
+        t, attr = self._type_attr(type_name, attr_name)
+        if value is None:
+            raise ValueError("Query value cannot be None")
+        if op == "==":
+            idx = self._attr_index(t, attr)
+            if idx is not None and (idx.kind == "hash" or is_number(value)):
+                rows = [(self._pois[pid], self._pois[pid].values.get(attr)) for pid in idx.equal(value)]
+                return [(p, v) for (p, v) in rows if _attr_equal(v, value)]
+            rows = []
+            for p in self._pois.values():
+                if p.poi_type is t:
+                    v = p.values.get(attr)
+                    if _attr_equal(v, value):
+                        rows.append((p, v))
+            rows.sort(key=lambda r: r[0].id)
+            return rows
+
+        bounds = {
+            "<": (None, value, True, False), "<=": (None, value, True, True),
+            ">": (value, None, False, True), ">=": (value, None, True, True),
+            "between": (value, value2, True, True),
+        }.get(op)
+        if bounds is None:
+            raise ValueError("op must be one of ==, <, <=, >, >=, between")
+        lo, hi, lo_incl, hi_incl = bounds
+        if (lo is not None and not is_number(lo)) or (hi is not None and not is_number(hi)):
+            raise ValueError("Range predicates need numeric bounds")
+        idx = self._attr_index(t, attr)
+        if idx is not None and idx.kind == "sorted":
+            return [(self._pois[pid], v) for (v, pid) in idx.range(lo, hi, lo_incl, hi_incl)]
+        rows = []
+        for p in self._pois.values():
+            if p.poi_type is not t:
+                continue
+            v = p.values.get(attr)
+            if not is_number(v):
+                continue
+            if lo is not None and (v < lo or (v == lo and not lo_incl)):
+                continue
+            if hi is not None and (v > hi or (v == hi and not hi_incl)):
+                continue
+            rows.append((v, p.id, p))
+        rows.sort(key=lambda r: (r[0], r[1]))
+        return [(p, v) for (v, _id, p) in rows]
+
     # ---------- PQ1 ----------
     def list_pois_of_type_with_values(self, type_name: str):
         """Return [(POI, {attr: value or None,...})] for the given type, in id->name order."""
+        return list(self.iter_pois_of_type_with_values(type_name))
+
+    def iter_pois_of_type_with_values(self, type_name: str):
+        """Lazy PQ1: yields the same rows as list_pois_of_type_with_values, one at a time.
+        Only the sorted id list is materialized; value dicts are built per row."""
         key = type_name.strip().lower()
         t = self._types.get(key)
         if not t:
-            return []
-        rows = []
-        for p in self._pois.values():
-            if p.poi_type is t:
-                full = {a: p.values.get(a, None) for a in t.attributes}
-                rows.append((p, full))
-        # deterministic order (id, then name) per brief’s rule
-        rows.sort(key=lambda r: (r[0].id, r[0].name))
-        return rows
+            return iter(())
+        # deterministic order (id, then name) per brief’s rule; ids are unique
+        ids = sorted(pid for pid, p in self._pois.items() if p.poi_type is t)
+        def rows():
+            for pid in ids:
+                p = self._pois[pid]
+                yield p, {a: p.values.get(a, None) for a in t.attributes}
+        return rows()
+
+    def page_pois_of_type_with_values(self, type_name: str, after: tuple | None = None, limit: int = 50):
+        """Keyset-paginated PQ1. Cursor = (id, name) of the last row of the previous page.
+        Returns (rows, next_cursor); next_cursor is None on the last page."""
+        t = self._types.get(type_name.strip().lower())
+        if not t:
+            return [], None
+        keys = ((p.id, p.name) for p in self._pois.values() if p.poi_type is t)
+        def row(key):
+            p = self._pois[key[0]]
+            return p, {a: p.values.get(a, None) for a in t.attributes}
+        return _keyset_page(keys, after, limit, row)
 
     # ---------- PQ2: closest pair of POIs (O(n^2), deterministic ties) ----------
     def closest_pair_pois(self):
@@ -281,6 +1014,32 @@ class POIRegistry:
             p1, p2 = p2, p1
         return (p1, p2), best_d
     
+    # ---------- All-POIs k-nearest-neighbour graph ----------
+    def knn_graph(self, k: int) -> KNNGraph:
+        """For every POI, its k nearest OTHER POIs, tie-break (distance, id, name).
+        Computed in one pass over a uniform cell grid (~k+1 POIs per cell) instead of
+        n separate nearest_k calls; cached until a POI is added or deleted.
+        """
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        cached = self._knn_cache
+        if cached is not None and cached[0] == self._poi_version and cached[1].k == k:
+            return cached[1]
+        g = build_knn_graph(list(self._pois.values()), k)
+        self._knn_cache = (self._poi_version, g)
+        return g
+
+    # ---------- Fixed-radius self-join: all POI pairs within r ----------
+    def pairs_within(self, r: float):
+        """Yield (p1, p2, distance) for every pair of active POIs with distance <= r,
+        boundary included with the same epsilon rule as within_radius; p1.id < p2.id.
+        Streams pairs from a cell bucketing (cell >= r) that compares only neighbouring
+        cells, so nothing is materialized. Order follows the cells, not the distance.
+        """
+        if r < 0 or math.isnan(r):               # nan matches nothing, as in within_radius
+            return iter(())
+        return iter_pairs_within(list(self._pois.values()), r)
+
     # ---------- PQ3: counts per type (include zero-count types) ----------
     def counts_per_type(self):
         """Return [(type_name, count)], sorted by count desc, then name asc."""
@@ -293,14 +1052,16 @@ class POIRegistry:
         return [(name, cnt) for (_neg, name, cnt) in rows] 
     
     #Visitors Query
-    def list_visited_pois_for_visitor(self, visitor_id: int):
+    @_needs_visits
+    def list_visited_pois_for_visitor(self, visitor_id: int, include_archived: bool = True):
         """Return [(poi_id, poi_name, date)] for ALL recorded visits of that visitor,
         sorted by date (oldest→newest), then poi id, then name.
+        This is a history query, so visits to deleted POIs are included by default.
         """
         if visitor_id not in self._visitors:
             raise KeyError(f"Unknown visitor id {visitor_id}")
         rows = []
-        for vis in self._visits:
+        for vis in self._iter_visits(include_archived):
             if vis.visitor.id == visitor_id:
                 dt = datetime.strptime(vis.date, DATE_FMT)
                 rows.append((dt, vis.poi.id, vis.poi.name, vis.date))
@@ -313,50 +1074,84 @@ class POIRegistry:
         If distinct=False: [(date, visitor_id, name, nationality)] sorted by date→id→name.
         If distinct=True:  [(earliest_date, visitor_id, name, nationality)] (one per visitor), id→name.
         """
+        return list(self.iter_visitors_for_poi(poi_id, distinct))
+
+    @_needs_visits
+    def iter_visitors_for_poi(self, poi_id: int, distinct: bool = False):
+        """Lazy VQ2 rows, same order as list_visitors_for_poi, streamed through a heap
+        of light (key, position) entries instead of a fully sorted row list."""
         if poi_id not in self._pois:
             raise KeyError(f"Unknown poi id {poi_id}")
 
+        seg = self._visits_by_poi.get(poi_id, ())
         if not distinct:
-            rows = []
-            for vis in self._visits:
-                if vis.poi.id == poi_id:
-                    rows.append((vis.date, vis.visitor.id, vis.visitor.name, vis.visitor.nationality))
-            rows.sort(key=lambda t: (t[0], t[1], t[2]))
-            return rows
+            keys = [(vis.date, vis.visitor.id, vis.visitor.name, i) for i, vis in enumerate(seg)]
+            def row(key):
+                vis = seg[key[3]]
+                return (vis.date, vis.visitor.id, vis.visitor.name, vis.visitor.nationality)
+            return _heap_stream(keys, row)
 
         # distinct visitors: keep earliest date per visitor
         earliest = {}
-        for vis in self._visits:
-            if vis.poi.id == poi_id:
-                vid = vis.visitor.id
-                if (vid not in earliest) or (vis.date < earliest[vid][0]):  # dd/mm/yyyy safe because we kept same format
-                    earliest[vid] = (vis.date, vis.visitor.name, vis.visitor.nationality)
-        rows = []
-        for vid, (date, name, nat) in earliest.items():
-            rows.append((date, vid, name, nat))
-        rows.sort(key=lambda t: (t[1], t[2]))  # id→name
-        return rows
+        for vis in seg:
+            vid = vis.visitor.id
+            if (vid not in earliest) or (vis.date < earliest[vid].date):  # dd/mm/yyyy safe because we kept same format
+                earliest[vid] = vis
+        keys = list(earliest)  # id→name (ids are unique)
+        def first_row(vid):
+            vis = earliest[vid]
+            return (vis.date, vid, vis.visitor.name, vis.visitor.nationality)
+        return _heap_stream(keys, first_row)
+
+    @_needs_visits
+    def page_visitors_for_poi(self, poi_id: int, distinct: bool = False,
+                              after: tuple | None = None, limit: int = 50):
+        """Keyset-paginated VQ2 rows, same order as list_visitors_for_poi.
+        Cursor: (date, visitor_id, name, seq) when distinct=False — seq is the visit's position
+        in the POI's log, so repeated identical visits are never skipped — else (visitor_id, name).
+        Returns (rows, next_cursor); next_cursor is None on the last page."""
+        if poi_id not in self._pois:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        seg = self._visits_by_poi.get(poi_id, ())
+        if not distinct:
+            keys = ((vis.date, vis.visitor.id, vis.visitor.name, i) for i, vis in enumerate(seg))
+            def row(key):
+                vis = seg[key[3]]
+                return (vis.date, vis.visitor.id, vis.visitor.name, vis.visitor.nationality)
+            return _keyset_page(keys, after, limit, row)
+        earliest = {}
+        for vis in seg:
+            vid = vis.visitor.id
+            if (vid not in earliest) or (vis.date < earliest[vid].date):
+                earliest[vid] = vis
+        keys = ((vid, vis.visitor.name) for vid, vis in earliest.items())
+        def first_row(key):
+            vis = earliest[key[0]]
+            return (vis.date, key[0], vis.visitor.name, vis.visitor.nationality)
+        return _keyset_page(keys, after, limit, first_row)
     
     # ---------- VQ2: number of DISTINCT visitors per POI (include zero-visit POIs) ----------
     def counts_distinct_visitors_per_poi(self):
         """Return [(POI, count)], sorted by count desc, then id, then name."""
-        # build poi_id -> set(visitor_ids)
-        distinct: Dict[int, set[int]] = {}
-        for vis in self._visits:
-            distinct.setdefault(vis.poi.id, set()).add(vis.visitor.id)
-        rows = []
-        for pid, p in self._pois.items():
-            cnt = len(distinct.get(pid, set()))
-            rows.append((-cnt, p.id, p.name, p, cnt))
-        rows.sort(key=lambda t: (t[0], t[1], t[2]))
-        return [(p, cnt) for (_nc, _id, _nm, p, cnt) in rows]
+        return list(self.iter_counts_distinct_visitors_per_poi())
+
+    @_needs_visits
+    def iter_counts_distinct_visitors_per_poi(self):
+        """Lazy VQ2 counts: yields (POI, count) in the same order, from a heap of
+        (-count, id) pairs (ids are unique, so the name tie-break never fires)."""
+        # distinct visitor ids straight from each POI's active visit segment
+        keys = [(-len({vis.visitor.id for vis in self._visits_by_poi.get(pid, ())}), pid)
+                for pid in self._pois]
+        return _heap_stream(keys, lambda k: (self._pois[k[1]], -k[0]))
 
     # ---------- VQ3: number of DISTINCT POIs per visitor (include visitors with zero) ----------
-    def counts_distinct_pois_per_visitor(self):
-        """Return [(Visitor, count)], sorted by count desc, then id, then name."""
+    @_needs_visits
+    def counts_distinct_pois_per_visitor(self, include_archived: bool = False):
+        """Return [(Visitor, count)], sorted by count desc, then id, then name.
+        Deleted POIs only count when include_archived=True."""
         # build visitor_id -> set(poi_ids)
         distinct: Dict[int, set[int]] = {vid: set() for vid in self._visitors.keys()}
-        for vis in self._visits:
+        for vis in self._iter_visits(include_archived):
             distinct.setdefault(vis.visitor.id, set()).add(vis.poi.id)
         rows = []
         for vid, v in self._visitors.items():
@@ -365,17 +1160,40 @@ class POIRegistry:
         rows.sort(key=lambda t: (t[0], t[1], t[2]))
         return [(v, cnt) for (_nc, _id, _nm, v, cnt) in rows]
 
+    @_needs_visits
+    def page_counts_distinct_pois_per_visitor(self, after: tuple | None = None, limit: int = 50,
+                                              include_archived: bool = False):
+        """Keyset-paginated VQ3. Cursor = (-count, id, name) of the previous page's last row.
+        Counts come from the per-visitor distinct-POI sets kept by record_visit, so a page
+        costs O(visitors * log limit) with no visit scan (include_archived falls back to one).
+        Returns (rows, next_cursor); next_cursor is None on the last page."""
+        if include_archived:
+            distinct: Dict[int, set[int]] = {}
+            for vis in self._iter_visits(include_archived=True):
+                distinct.setdefault(vis.visitor.id, set()).add(vis.poi.id)
+        else:
+            distinct = self._visitor_pois
+        keys = ((-len(distinct.get(vid, ())), vid, v.name) for vid, v in self._visitors.items())
+        return _keyset_page(keys, after, limit, lambda k: (self._visitors[k[1]], -k[0]))
+
     # ---------- VQ7: coverage fairness ----------
-    def visitors_meeting_coverage(self, m: int, t: int):
+    @_needs_visits
+    def visitors_meeting_coverage(self, m: int, t: int, include_archived: bool = False):
         """Visitors who visited ≥ m DISTINCT POIs across ≥ t DISTINCT TYPES.
         Return [(Visitor, poi_count, type_count)], sorted by poi_count desc,
         then type_count desc, then id, then name.
+        Deleted POIs only count when include_archived=True.
         """
         if m < 0 or t < 0:
             raise ValueError("m and t must be non-negative integers")
+        if not include_archived:
+            # rows with poi_count >= m are a prefix of the table; only type_count is filtered
+            rows = self._coverage_table()
+            end = bisect_right(rows, (-m, float("inf")))
+            return [(v, -np, -nt) for (np, nt, _id, _nm, v) in rows[:end] if -nt >= t]
         poi_sets: Dict[int, set[int]] = {}
         type_sets: Dict[int, set[str]] = {}
-        for vis in self._visits:
+        for vis in self._iter_visits(include_archived):
             vid = vis.visitor.id
             poi_sets.setdefault(vid, set()).add(vis.poi.id)
             type_sets.setdefault(vid, set()).add(vis.poi.poi_type.name)
@@ -388,6 +1206,20 @@ class POIRegistry:
         rows.sort(key=lambda r: (r[0], r[1], r[2], r[3]))
         return [(v, pois, types) for (_np, _nt, _id, _nm, v, pois, types) in rows]
     
+    def _coverage_table(self) -> list:
+        # O(V log V) from the per-visitor bitmaps and type masks, no visit scan; reused by
+        # every (m, t) query until the next change in someone's coverage
+        if self._coverage_rows is None:
+            rows = []
+            for vid, v in self._visitors.items():
+                bm = self._visitor_pois.get(vid)
+                pois = len(bm) if bm is not None else 0
+                types = self._visitor_types.get(vid, 0).bit_count()
+                rows.append((-pois, -types, vid, v.name, v))
+            rows.sort(key=lambda r: (r[0], r[1], r[2], r[3]))
+            self._coverage_rows = rows
+        return self._coverage_rows
+
     # ---------- Extension: rename attribute on a type ----------
     def rename_attribute_on_type(self, type_name: str, old_attr: str, new_attr: str) -> None:
         key = type_name.strip().lower()
@@ -400,15 +1232,107 @@ class POIRegistry:
         # rename in schema
         idx = t.attributes.index(old)
         t.attributes[idx] = new
-        # migrate values on existing POIs
-        for p in self._pois.values():
-            if p.poi_type is t and old in p.values:
-                if new not in p.values:
-                    p.values[new] = p.values.pop(old)
-                else:
-                    # policy: keep existing 'new', drop 'old'
-                    del p.values[old]
+        # values on existing POIs are migrated lazily on read
+        # (policy unchanged: if a POI already has 'new', keep it and drop 'old')
+        t.record_migration("rename", old, new)
+        self._schema_gen += 1
+        idxs = self._attr_indexes.get(t, {})
+        if old in idxs:
+            # a POI may already carry a stray 'new' key that wins over 'old',
+            # so the moved index is rebuilt on its next use rather than trusted
+            idx = idxs.pop(old)
+            idx.stale = True
+            idxs[new] = idx
     
+    # ---------- Extension: physical compaction of lazy schema migrations ----------
+    def compact_schema(self, type_name: str | None = None, limit: int | None = None) -> int:
+        """Apply pending attribute migrations to stored POI values (all types, or one).
+        Stops after `limit` POIs when given, so it can run in small slices: the next call
+        resumes where this one stopped, so a full run of slices visits each POI once.
+        Returns how many POIs were rewritten; 0 means everything is current."""
+        t = None
+        if type_name is not None:
+            t = self._types.get(type_name.strip().lower())
+            if not t:
+                raise KeyError(f"Unknown POI type '{type_name}'")
+        if limit is not None and limit <= 0:
+            return 0
+        done = 0
+        while True:
+            state = self._compact_passes.get(t)
+            if state is None:
+                state = self._compact_passes[t] = (iter(list(self._pois)), self._schema_gen)
+            ids, gen = state
+            for pid in ids:
+                p = self._pois.get(pid)
+                if p is not None and (t is None or p.poi_type is t) and p.schema_stale:
+                    p.values  # reading resolves and stores the migrated dict
+                    done += 1
+                    if done == limit:
+                        return done
+            del self._compact_passes[t]
+            # new POIs start current, so a full pass with no migration since it began
+            # leaves nothing stale; otherwise walk again from the start
+            if gen == self._schema_gen:
+                return done
+
+    def start_background_compaction(self, batch: int = 1000, pause: float = 0.0) -> threading.Thread:
+        """Run compact_schema in `batch`-sized slices on a daemon thread until nothing is stale."""
+        def run():
+            while self.compact_schema(limit=batch):
+                time.sleep(pause)  # yield the GIL between slices
+        th = threading.Thread(target=run, name="schema-compaction", daemon=True)
+        th.start()
+        return th
+
+    # ---------- Memory accounting ----------
+    def memory_report(self) -> dict:
+        """Deep size in bytes of every internal structure, plus averages per POI/visitor/visit.
+
+        Objects shared between structures are charged once, to the first one listed
+        (a Visit's POI and Visitor are already in "pois"/"visitors"), so the parts add up
+        to "total". per_poi = (pois + poi values) / #POIs, per_visitor = visitors / #visitors,
+        per_visit = (visits + archived visits) / #visits.
+        """
+        seen: Set[int] = set()
+        parts = [
+            ("types", [self._types]),
+            ("poi values", (p._values for p in self._pois.values())),  # raw dicts, no migration
+            ("pois", [self._pois]),
+            ("visitors", [self._visitors]),
+            ("visits", [self._visits_by_poi]),
+            ("archived visits", [self._archived_visits]),
+            ("used poi ids", [self._used_poi_ids]),
+            ("ratings", [self._poi_ratings, self._type_ratings, self._all_ratings]),
+            ("visitor poi bitmaps", [self._visitor_pois]),
+            ("visitor type masks", [self._visitor_types]),
+            ("coverage table", [self._coverage_rows]),
+            ("co-visitation", [self._covis]),
+            ("hll sketches", [self._hll_poi_visitors, self._hll_visitor_pois, self._hll_visitor_types]),
+            ("type cell buckets", [self._type_cells]),
+            ("coordinate columns", [self._col_row, self._col_id, self._col_x, self._col_y,
+                                    self._col_code, self._col_visits]),
+            ("visit columns", [self._vcol_visitor, self._vcol_poi, self._vcol_code]),
+            ("rectangle count grids", [self._poi_grid, self._type_grids, self._visit_grid]),
+            ("knn cache", [self._knn_cache]),
+            ("attribute indexes", [self._attr_indexes]),
+            ("name indexes", [self._poi_names, self._visitor_names]),
+            ("subscriptions", [self._subs, self._sub_index]),
+            ("pending visits index", [self._pending_visits]),
+        ]
+        structures = {name: sum(deep_sizeof(o, seen) for o in objs) for name, objs in parts}
+        n_pois, n_visitors = len(self._pois), len(self._visitors)
+        n_visits = sum(map(len, self._visits_by_poi.values())) + sum(map(len, self._archived_visits.values()))
+        visit_bytes = structures["visits"] + structures["archived visits"]
+        return {
+            "structures": structures,
+            "total": sum(structures.values()),
+            "counts": {"pois": n_pois, "visitors": n_visitors, "visits": n_visits},
+            "per_poi": (structures["pois"] + structures["poi values"]) / n_pois if n_pois else 0.0,
+            "per_visitor": structures["visitors"] / n_visitors if n_visitors else 0.0,
+            "per_visit": visit_bytes / n_visits if n_visits else 0.0,
+        }
+
     # ---------- Extension: rename a POI type ----------
     def rename_poi_type(self, old_name: str, new_name: str) -> None:
         oldk = old_name.strip().lower(); newk = new_name.strip().lower()
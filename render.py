@@ -0,0 +1,133 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence, Tuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from models import MAP_SIZE
+from registry import POIRegistry
+
+# Rasterized rendering for notebooks. Instead of one matplotlib artist per POI (minutes and
+# gigabytes at a million points), POI centers are binned straight from the registry's
+# coordinate columns into a fixed width x height buffer with np.bincount, and the buffer is
+# drawn with a single imshow. Binning is one vectorised pass; drawing cost depends only on
+# the image size, not on how many POIs there are.
+
+Window = Tuple[int, int, int, int]  # x0, y0, x1, y1 in map units, half-open [x0, x1) x [y0, y1)
+FULL_MAP: Window = (0, 0, MAP_SIZE, MAP_SIZE)
+SOURCES = ("pois", "visits")
+
+
+def _check_window(window: Window | None) -> Window:
+    if window is None:
+        return FULL_MAP
+    x0, y0, x1, y1 = (int(v) for v in window)
+    if not (0 <= x0 < x1 <= MAP_SIZE and 0 <= y0 < y1 <= MAP_SIZE):
+        raise ValueError(f"window must satisfy 0 <= x0 < x1 <= {MAP_SIZE} and 0 <= y0 < y1 <= {MAP_SIZE}")
+    return x0, y0, x1, y1
+
+def _frame(source: str, width: int, height: int | None, window: Window | None) -> Tuple[Window, int]:
+    # validate arguments; a missing height keeps the window's aspect ratio
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {SOURCES}")
+    if width <= 0 or (height is not None and height <= 0):
+        raise ValueError("width and height must be positive integers")
+    window = _check_window(window)
+    if height is None:
+        height = max(1, round(width * (window[3] - window[1]) / (window[2] - window[0])))
+    return window, height
+
+def _columns(reg: POIRegistry) -> Dict[str, np.ndarray]:
+    # np.array copies the live array.array buffers, so the registry can keep changing
+    _ids, xs, ys, codes, visits = reg.coordinate_arrays()
+    return {"x": np.array(xs, dtype=np.int64), "y": np.array(ys, dtype=np.int64),
+            "code": np.array(codes, dtype=np.int64), "visits": np.array(visits, dtype=np.float64)}
+
+def _bin(cols: Dict[str, np.ndarray], keep: np.ndarray, source: str,
+         window: Window, width: int, height: int) -> np.ndarray:
+    x0, y0, x1, y1 = window
+    xs, ys = cols["x"], cols["y"]
+    keep = keep & (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+    ix = (xs[keep] - x0) * width // (x1 - x0)
+    iy = (ys[keep] - y0) * height // (y1 - y0)
+    weights = cols["visits"][keep] if source == "visits" else None
+    flat = np.bincount(iy * width + ix, weights=weights, minlength=width * height)
+    return flat.reshape(height, width).astype(np.float64)
+
+def rasterize(reg: POIRegistry, source: str = "pois", width: int = 512, height: int | None = None,
+              window: Window | None = None, types: Sequence[str] | None = None) -> np.ndarray:
+    """[height, width] array of POI counts (or visit counts, source="visits") per pixel.
+    Row 0 is the window's lowest y: draw with origin="lower" (show() does)."""
+    window, height = _frame(source, width, height, window)
+    cols = _columns(reg)
+    keep = np.ones(len(cols["x"]), dtype=bool)
+    if types is not None:
+        keep = np.isin(cols["code"], _codes(reg, types))
+    return _bin(cols, keep, source, window, width, height)
+
+def rasterize_types(reg: POIRegistry, types: Sequence[str], source: str = "pois", width: int = 512,
+                    height: int | None = None, window: Window | None = None) -> np.ndarray:
+    """[height, width, len(types)] stack, one channel per type (same binning as rasterize)."""
+    window, height = _frame(source, width, height, window)
+    cols = _columns(reg)
+    codes = _codes(reg, types)
+    return np.stack([_bin(cols, cols["code"] == c, source, window, width, height) for c in codes], axis=-1)
+
+def _codes(reg: POIRegistry, types: Sequence[str]) -> List[int]:
+    if isinstance(types, str):
+        types = [types]
+    known = reg.type_codes()
+    out = []
+    for name in types:
+        key = name.strip().lower()
+        if key not in known:
+            raise KeyError(f"Unknown POI type '{name}'")
+        out.append(known[key])
+    return out
+
+def to_rgb(channels: np.ndarray, colors: Sequence[Tuple[float, float, float]] | None = None,
+           log: bool = True) -> np.ndarray:
+    """Blend a [h, w, n] channel stack into an RGB image in [0, 1].
+    Each channel is normalised on its own (log1p by default, so sparse types stay visible)."""
+    n = channels.shape[-1]
+    if colors is None:
+        palette = plt.get_cmap("tab10").colors
+        colors = [palette[i % len(palette)] for i in range(n)]
+    if len(colors) < n:
+        raise ValueError("need one colour per channel")
+    vals = np.log1p(channels) if log else channels.astype(np.float64)
+    peak = vals.max(axis=(0, 1))
+    vals = vals / np.where(peak > 0, peak, 1)
+    rgb = vals @ np.asarray(colors[:n], dtype=np.float64)[:, :3]
+    return np.clip(rgb, 0.0, 1.0)
+
+def show(image: np.ndarray, window: Window | None = None, ax=None, title: str | None = None,
+         cmap: str = "magma", log: bool = True):
+    """imshow a raster from rasterize (counts, colour-mapped) or to_rgb (RGB) in map units."""
+    x0, y0, x1, y1 = _check_window(window)
+    if ax is None:
+        _fig, ax = plt.subplots(figsize=(6, 6))
+    if image.ndim == 2:
+        data = np.log1p(image) if log else image
+        ax.imshow(data, origin="lower", extent=(x0, x1, y0, y1), cmap=cmap, interpolation="nearest")
+    else:
+        ax.imshow(image, origin="lower", extent=(x0, x1, y0, y1), interpolation="nearest")
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+    if title:
+        ax.set_title(title)
+    return ax
+
+def render(reg: POIRegistry, source: str = "pois", types: Sequence[str] | None = None,
+           window: Window | None = None, width: int = 512, ax=None,
+           colors: Sequence[Tuple[float, float, float]] | None = None):
+    """One-call notebook view: a density map, or one colour per type when `types` is given."""
+    if isinstance(types, str):
+        types = [types]
+    if types:
+        img = to_rgb(rasterize_types(reg, types, source, width, window=window), colors)
+        title = f"{source} by type: " + ", ".join(types)
+    else:
+        img = rasterize(reg, source, width, window=window)
+        title = f"{source} density"
+    return show(img, window, ax=ax, title=title)
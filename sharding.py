@@ -0,0 +1,197 @@
+from __future__ import annotations
+import heapq
+import multiprocessing as mp
+from typing import Dict, List, Tuple
+
+from models import MAP_SIZE, EPS, POI, POIType, _check_coord
+from registry import POIRegistry
+
+# Spatially sharded mode: the 1000x1000 grid is cut into nx * ny regions, each owned by a
+# worker process with its own POIRegistry (so queries use many cores, not one GIL).
+# The front end routes writes to the owning shard, scatters spatial queries only to shards
+# whose region can hold a result, and merges answers with the global (distance, id, name)
+# tie-break. POI id non-reuse is enforced here, across all shards.
+# Scope: types and POIs. Visitors/visits stay in the single-process POIRegistry.
+
+Region = Tuple[int, int, int, int]  # x0, y0, x1, y1 (half-open: x0 <= x < x1)
+
+
+def _worker(conn) -> None:
+    reg = POIRegistry()
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        name, args = msg
+        try:
+            conn.send((True, getattr(reg, name)(*args)))
+        except Exception as e:  # ship the error back, keep serving
+            conn.send((False, e))
+    conn.close()
+
+def _min_dist(region: Region, x: int, y: int) -> float:
+    # distance from (x, y) to the closest integer point of the region
+    x0, y0, x1, y1 = region
+    dx = max(x0 - x, 0, x - (x1 - 1))
+    dy = max(y0 - y, 0, y - (y1 - 1))
+    return (dx * dx + dy * dy) ** 0.5
+
+def _merge(parts: List[List[Tuple[POI, float]]]) -> List[Tuple[POI, float]]:
+    # every shard answer is already sorted by (distance, id, name)
+    return list(heapq.merge(*parts, key=lambda r: (r[1], r[0].id, r[0].name)))
+
+
+class ShardedRegistry:
+    def __init__(self, nx: int = 2, ny: int = 2, start_method: str | None = None):
+        if nx <= 0 or ny <= 0:
+            raise ValueError("nx and ny must be positive integers")
+        xs = [i * MAP_SIZE // nx for i in range(nx + 1)]
+        ys = [j * MAP_SIZE // ny for j in range(ny + 1)]
+        self._nx, self._ny, self._xs, self._ys = nx, ny, xs, ys
+        self._regions: List[Region] = [(xs[i], ys[j], xs[i + 1], ys[j + 1])
+                                       for j in range(ny) for i in range(nx)]
+        ctx = mp.get_context(start_method)
+        self._conns = []
+        self._procs = []
+        for _ in self._regions:
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(child,), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self._used_poi_ids: set[int] = set()    # global “ID non-reuse”
+        self._owner: Dict[int, int] = {}         # active poi_id -> shard index
+        self._type_use: Dict[str, int] = {}      # type key -> active POI count (all shards)
+
+    # --- plumbing ---
+    def _scatter(self, shards: List[int], name: str, *args) -> list:
+        for s in shards:
+            self._conns[s].send((name, args))
+        results, error = [], None
+        for s in shards:                        # always drain every reply before raising
+            ok, value = self._conns[s].recv()
+            if ok:
+                results.append(value)
+            elif error is None:
+                error = value
+        if error is not None:
+            raise error
+        return results
+
+    def _call(self, shard: int, name: str, *args):
+        return self._scatter([shard], name, *args)[0]
+
+    def _all(self) -> List[int]:
+        return list(range(len(self._regions)))
+
+    def shard_of(self, x: int, y: int) -> int:
+        x, y = _check_coord(x, y)
+        i = next(i for i in range(self._nx) if x < self._xs[i + 1])
+        j = next(j for j in range(self._ny) if y < self._ys[j + 1])
+        return j * self._nx + i
+
+    def close(self) -> None:
+        for conn, proc in zip(self._conns, self._procs):
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            proc.join(timeout=5)
+            conn.close()
+        self._conns, self._procs = [], []
+
+    def __enter__(self) -> "ShardedRegistry":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- Types (replicated on every shard) ---
+    def add_type(self, name: str, attributes: List[str] | None = None) -> POIType:
+        t = self._scatter(self._all(), "add_type", name, attributes)[0]
+        self._type_use.setdefault(t.name, 0)
+        return t
+
+    def delete_type(self, name: str) -> bool:
+        key = name.strip().lower()
+        if key not in self._type_use:
+            return False
+        if self._type_use[key]:
+            raise ValueError(f"Cannot delete type '{name}': this type is used by existing POIs")
+        self._scatter(self._all(), "delete_type", name)
+        del self._type_use[key]
+        return True
+
+    def rename_poi_type(self, old_name: str, new_name: str) -> None:
+        self._scatter(self._all(), "rename_poi_type", old_name, new_name)
+        self._type_use[new_name.strip().lower()] = self._type_use.pop(old_name.strip().lower())
+
+    def add_attribute_to_type(self, type_name: str, attr_name: str) -> None:
+        self._scatter(self._all(), "add_attribute_to_type", type_name, attr_name)
+
+    def delete_attribute_from_type(self, type_name: str, attr_name: str) -> bool:
+        return self._scatter(self._all(), "delete_attribute_from_type", type_name, attr_name)[0]
+
+    def rename_attribute_on_type(self, type_name: str, old_attr: str, new_attr: str) -> None:
+        self._scatter(self._all(), "rename_attribute_on_type", type_name, old_attr, new_attr)
+
+    def list_types(self) -> List[str]:
+        return sorted(self._type_use)
+
+    # --- POIs (routed to the owning shard) ---
+    def add_poi(self, poi_id: int, name: str, type_name: str,
+                x: int, y: int, values: Dict[str, object] | None = None) -> POI:
+        if poi_id in self._used_poi_ids:
+            raise ValueError(f"POI id {poi_id} was used before and cannot be reused once again")
+        s = self.shard_of(x, y)
+        p = self._call(s, "add_poi", poi_id, name, type_name, x, y, values)
+        self._used_poi_ids.add(poi_id)
+        self._owner[poi_id] = s
+        self._type_use[p.poi_type.name] += 1
+        return p
+
+    def delete_poi(self, poi_id: int) -> bool:
+        s = self._owner.pop(poi_id, None)
+        if s is None:
+            return False
+        p = self._call(s, "get_poi", poi_id)
+        self._call(s, "delete_poi", poi_id)
+        self._type_use[p.poi_type.name] -= 1
+        return True
+
+    def list_pois(self) -> List[POI]:
+        return [p for part in self._scatter(self._all(), "list_pois") for p in part]
+
+    def counts_per_type(self):
+        """Return [(type_name, count)], sorted by count desc, then name asc."""
+        return sorted(self._type_use.items(), key=lambda t: (-t[1], t[0]))
+
+    # --- Spatial queries (scatter only where results can be, then merge) ---
+    def nearest_k(self, x: int, y: int, k: int, types=None):
+        x, y = _check_coord(x, y)
+        if k <= 0:
+            return []
+        home = self.shard_of(x, y)
+        first = self._call(home, "nearest_k", x, y, k, types)
+        bound = first[-1][1] if len(first) == k else float("inf")
+        # a shard can only help if its region is no farther than the current k-th distance
+        # (<=, not <: an equal distance with a smaller id must still win the tie-break)
+        others = [s for s, reg in enumerate(self._regions)
+                  if s != home and _min_dist(reg, x, y) <= bound + EPS]
+        parts = [first] + self._scatter(others, "nearest_k", x, y, k, types)
+        return _merge(parts)[:k]
+
+    def within_radius(self, x: int, y: int, r: float, types=None):
+        x, y = _check_coord(x, y)
+        if r < 0:
+            return []
+        shards = [s for s, reg in enumerate(self._regions) if _min_dist(reg, x, y) <= r + EPS]
+        return _merge(self._scatter(shards, "within_radius", x, y, r, types))
+
+    def exactly_on_boundary(self, x: int, y: int, r: float):
+        x, y = _check_coord(x, y)
+        if r < 0:
+            return []
+        shards = [s for s, reg in enumerate(self._regions) if _min_dist(reg, x, y) <= r + EPS]
+        return _merge(self._scatter(shards, "exactly_on_boundary", x, y, r))
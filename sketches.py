@@ -0,0 +1,99 @@
+from __future__ import annotations
+import hashlib
+import math
+from array import array
+from bisect import bisect_left
+
+_MASK64 = (1 << 64) - 1
+_INV_POW2 = [2.0 ** -r for r in range(65)]
+_RANK_BITS = 6  # ranks are at most 64 - p + 1 <= 61
+_RANK_MASK = (1 << _RANK_BITS) - 1
+
+
+def hash64(item: int | str) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process for str)."""
+    if isinstance(item, int):
+        z = (item + 0x9E3779B97F4A7C15) & _MASK64      # splitmix64 finalizer
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+    return int.from_bytes(hashlib.blake2b(str(item).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Approximate distinct counter with m = 2**p registers.
+
+    Error bound: relative standard error ~ 1.04 / sqrt(m), i.e. about
+    p=10: 3.3% (1 KiB), p=12: 1.6% (4 KiB), p=14: 0.8% (16 KiB); ~95% of estimates
+    fall within twice that. Small sets use linear counting and are near exact.
+    Starts sparse (only touched registers, as sorted idx << 6 | rank words in a 4-byte
+    array) and switches to a dense bytearray once m / 4 registers are set, i.e. when
+    the sparse words would outgrow it; a sketch never holds more than ~m bytes of
+    registers. Sketches with the same p merge by register-wise max, giving the sketch
+    of the union.
+    """
+    __slots__ = ("p", "m", "_sparse", "_dense")
+
+    def __init__(self, p: int = 12):
+        if not 4 <= p <= 16:
+            raise ValueError("HyperLogLog precision p must be in 4..16")
+        self.p = p
+        self.m = 1 << p
+        self._sparse: array | None = array("I")
+        self._dense: bytearray | None = None
+
+    def add(self, item: int | str) -> None:
+        h = hash64(item)
+        q = 64 - self.p
+        idx = h >> q
+        rank = q - (h & ((1 << q) - 1)).bit_length() + 1
+        self._set(idx, rank)
+
+    def _set(self, idx: int, rank: int) -> None:
+        if self._dense is not None:
+            if rank > self._dense[idx]:
+                self._dense[idx] = rank
+            return
+        sparse = self._sparse
+        i = bisect_left(sparse, idx << _RANK_BITS)
+        if i < len(sparse) and sparse[i] >> _RANK_BITS == idx:
+            if rank > sparse[i] & _RANK_MASK:
+                sparse[i] = idx << _RANK_BITS | rank
+            return
+        sparse.insert(i, idx << _RANK_BITS | rank)
+        if 4 * len(sparse) > self.m:
+            self._densify()
+
+    def _registers(self):
+        # (idx, rank) of every set register
+        if self._dense is None:
+            return ((w >> _RANK_BITS, w & _RANK_MASK) for w in self._sparse)
+        return enumerate(self._dense)
+
+    def _densify(self) -> None:
+        dense = bytearray(self.m)
+        for idx, rank in self._registers():
+            dense[idx] = rank
+        self._dense, self._sparse = dense, None
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """In-place union with another sketch of the same precision."""
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        for idx, rank in other._registers():
+            if rank:
+                self._set(idx, rank)
+
+    def count(self) -> int:
+        m = self.m
+        if self._dense is None:
+            zeros = m - len(self._sparse)
+            total = zeros + sum(_INV_POW2[w & _RANK_MASK] for w in self._sparse)
+        else:
+            zeros = self._dense.count(0)
+            total = sum(_INV_POW2[r] for r in self._dense)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / total
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)   # linear counting for small cardinalities
+        return int(round(est))
@@ -0,0 +1,278 @@
+from __future__ import annotations
+import math
+from array import array
+from operator import add
+from typing import Dict, Iterable, List, Tuple
+
+from models import MAP_SIZE, EPS, POI, is_close
+
+Cell = Tuple[int, int]
+
+
+class FenwickGrid:
+    """2D Fenwick (binary indexed) tree of per-cell counts on the MAP_SIZE x MAP_SIZE grid.
+
+    `add` and `rect_sum` are both O(log^2 size) (~100 steps on the 1000x1000 map), so
+    updates interleaved with queries stay cheap wherever they land.
+    `from_points` bulk-builds in linear time with whole-row/column array slices.
+    Memory: one flat array, ~4 MB with the default 32-bit typecode.
+    """
+    def __init__(self, size: int = MAP_SIZE, typecode: str = "i"):
+        self.size = size
+        self._tc = typecode
+        self._tree = array(typecode, bytes(array(typecode).itemsize * size * size))  # row-major, row = y
+
+    @classmethod
+    def from_points(cls, points: Iterable[Tuple[int, int]], size: int = MAP_SIZE,
+                    typecode: str = "i") -> "FenwickGrid":
+        g = cls(size, typecode)
+        t, n = g._tree, size
+        for x, y in points:
+            t[y * n + x] += 1
+        # in-place linear build: push every column into its Fenwick parent column, then rows
+        for i in range(n):
+            j = i | (i + 1)
+            if j < n:
+                t[j::n] = array(typecode, map(add, t[j::n], t[i::n]))
+        for i in range(n):
+            j = i | (i + 1)
+            if j < n:
+                t[j * n:(j + 1) * n] = array(typecode, map(add, t[j * n:(j + 1) * n], t[i * n:(i + 1) * n]))
+        return g
+
+    def add(self, x: int, y: int, delta: int = 1) -> None:
+        t, n = self._tree, self.size
+        j = y
+        while j < n:
+            row = j * n
+            i = x
+            while i < n:
+                t[row + i] += delta
+                i |= i + 1
+            j |= j + 1
+
+    def _prefix(self, x: int, y: int) -> int:
+        # sum of cells with cx <= x and cy <= y (0 when either is negative)
+        t, n = self._tree, self.size
+        total = 0
+        j = y
+        while j >= 0:
+            row = j * n
+            i = x
+            while i >= 0:
+                total += t[row + i]
+                i = (i & (i + 1)) - 1
+            j = (j & (j + 1)) - 1
+        return total
+
+    def rect_sum(self, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Sum over the inclusive box [x0..x1] x [y0..y1], clipped to the grid."""
+        n = self.size
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, n - 1), min(y1, n - 1)
+        if x0 > x1 or y0 > y1:
+            return 0
+        return (self._prefix(x1, y1) - self._prefix(x0 - 1, y1)
+                - self._prefix(x1, y0 - 1) + self._prefix(x0 - 1, y0 - 1))
+
+    def heatmap(self, cell: int) -> List[List[int]]:
+        """Downsample to ceil(size/cell) x ceil(size/cell) block sums; rows are y, columns x."""
+        if cell <= 0:
+            raise ValueError("cell must be a positive integer")
+        n = self.size
+        m = -(-n // cell)
+        edges = [-1] + [min((b + 1) * cell, n) - 1 for b in range(m)]  # last cell of each block
+        # prefix sums at every block corner, then one difference per block
+        P = [[self._prefix(x, y) for x in edges] for y in edges]
+        return [[P[r + 1][c + 1] - P[r][c + 1] - P[r + 1][c] + P[r][c] for c in range(m)] for r in range(m)]
+
+
+# ---------- uniform cell bucketing (shared by batch spatial queries) ----------
+def bucket_by_cell(pois: Iterable[POI], cell: float) -> Dict[Cell, List[POI]]:
+    """Group POIs by the cell x cell square their center falls in."""
+    buckets: Dict[Cell, List[POI]] = {}
+    for p in pois:
+        x, y = p.coord
+        buckets.setdefault(cell_of(x, y, cell), []).append(p)
+    return buckets
+
+def cell_of(x: int, y: int, cell: float) -> Cell:
+    return int(x // cell), int(y // cell)
+
+def iter_bucketed_in_box(buckets: Dict[Cell, List[POI]], cell: float,
+                         x0: float, y0: float, x1: float, y1: float):
+    """POIs of every bucket whose cell overlaps the box (a superset of the POIs inside it).
+    The box is clamped to the map first, so infinite bounds are fine; nan bounds are not."""
+    hi = MAP_SIZE - 1
+    x0, y0 = min(max(x0, 0), hi), min(max(y0, 0), hi)
+    x1, y1 = min(max(x1, 0), hi), min(max(y1, 0), hi)
+    cx0, cy0 = int(x0 // cell), int(y0 // cell)
+    cx1, cy1 = int(x1 // cell), int(y1 // cell)
+    if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(buckets):
+        keys = (key for key in buckets if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1)
+    else:
+        keys = ((i, j) for i in range(cx0, cx1 + 1) for j in range(cy0, cy1 + 1))
+    for key in keys:
+        yield from buckets.get(key, ())
+
+def _ring(cx: int, cy: int, r: int):
+    # cells at Chebyshev distance exactly r from (cx, cy)
+    if r == 0:
+        yield cx, cy
+        return
+    for dx in range(-r, r + 1):
+        yield cx + dx, cy - r
+        yield cx + dx, cy + r
+    for dy in range(-r + 1, r):
+        yield cx - r, cy + dy
+        yield cx + r, cy + dy
+
+def ring_search(buckets: Dict[Cell, List[POI]], cell: float, x: int, y: int, k: int,
+                skip: POI | None = None, total: int | None = None):
+    """k nearest POIs to (x, y) by expanding rings of cells.
+    Returns [(d, id, name, POI)] sorted by (distance, id, name), same as nearest_k.
+    Anything outside rings 0..r is strictly farther than r*cell, so we stop as soon
+    as the k-th candidate is within that bound (ties can't hide in unseen rings),
+    or once all `total` bucketed POIs have been seen.
+    """
+    cx, cy = int(x // cell), int(y // cell)
+    last = int(MAP_SIZE // cell) + 1   # beyond this ring there are no cells left
+    if total is None:
+        total = sum(len(b) for b in buckets.values())
+    if skip is not None:
+        total -= 1
+    seen = 0
+    cands = []
+    for r in range(0, last + 1):
+        for key in _ring(cx, cy, r):
+            for p in buckets.get(key, ()):
+                if p is skip:
+                    continue
+                px, py = p.coord
+                cands.append((math.hypot(px - x, py - y), p.id, p.name, p))
+                seen += 1
+        if len(cands) >= k:
+            cands = sorted(cands, key=lambda t: (t[0], t[1], t[2]))[:k]
+            if cands[-1][0] <= r * cell:
+                break
+        if seen >= total:
+            break
+    return sorted(cands, key=lambda t: (t[0], t[1], t[2]))[:k]
+
+
+class KNNGraph:
+    """All-POIs k-nearest-neighbour lists in CSR form.
+    Row i belongs to ids[i]; its neighbours are neighbor_ids/distances[offsets[i]:offsets[i+1]],
+    ordered by (distance, id, name). Rows are shorter than k only when there are < k+1 POIs.
+    """
+    def __init__(self, k: int):
+        self.k = k
+        self.ids = array("q")
+        self.offsets = array("q", [0])
+        self.neighbor_ids = array("q")
+        self.distances = array("d")
+        self._row: Dict[int, int] = {}
+
+    def _append(self, poi_id: int, row) -> None:
+        self._row[poi_id] = len(self.ids)
+        self.ids.append(poi_id)
+        for d, nid, _nm, _p in row:
+            self.neighbor_ids.append(nid)
+            self.distances.append(d)
+        self.offsets.append(len(self.neighbor_ids))
+
+    def neighbors(self, poi_id: int) -> List[Tuple[int, float]]:
+        """Return [(neighbor_id, distance)] for a POI."""
+        i = self._row.get(poi_id)
+        if i is None:
+            raise KeyError(f"Unknown poi id {poi_id}")
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return list(zip(self.neighbor_ids[a:b], self.distances[a:b]))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+def build_knn_graph(pois: List[POI], k: int) -> KNNGraph:
+    """One pass over a uniform grid sized for ~k+1 POIs per cell of the occupied box."""
+    g = KNNGraph(k)
+    n = len(pois)
+    if n == 0:
+        return g
+    xs = [p.coord[0] for p in pois]
+    ys = [p.coord[1] for p in pois]
+    area = (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)   # size cells to the occupied box
+    cell = max(1.0, math.sqrt(area * (k + 1) / n))
+    buckets = bucket_by_cell(pois, cell)
+    for p in sorted(pois, key=lambda q: q.id):
+        x, y = p.coord
+        g._append(p.id, ring_search(buckets, cell, x, y, k, skip=p, total=n))
+    return g
+
+
+_HALF_STENCIL = ((1, 0), (-1, 1), (0, 1), (1, 1))  # each neighbouring cell pair visited once
+
+def iter_pairs_within(pois: Iterable[POI], r: float):
+    """Yield (p1, p2, d) for all POI pairs with d <= r (epsilon-inclusive), p1.id < p2.id.
+    Cells are at least r + EPS wide, so a qualifying pair always sits in the same or
+    adjacent cells; only the half stencil of neighbours is compared.
+    """
+    cell = max(r + EPS, 1.0)
+    buckets = bucket_by_cell(pois, cell)
+    for (cx, cy), here in buckets.items():
+        n = len(here)
+        for i in range(n):
+            a = here[i]
+            ax, ay = a.coord
+            for j in range(i + 1, n):
+                b = here[j]
+                bx, by = b.coord
+                d = math.hypot(ax - bx, ay - by)
+                if d < r or is_close(d, r):
+                    yield (a, b, d) if a.id < b.id else (b, a, d)
+        for dx, dy in _HALF_STENCIL:
+            there = buckets.get((cx + dx, cy + dy))
+            if not there:
+                continue
+            for a in here:
+                ax, ay = a.coord
+                for b in there:
+                    bx, by = b.coord
+                    d = math.hypot(ax - bx, ay - by)
+                    if d < r or is_close(d, r):
+                        yield (a, b, d) if a.id < b.id else (b, a, d)
+
+
+class CircleIndex:
+    """Uniform grid over the map: cell -> ids of the circles whose bounding box touches it.
+    A point only has to be tested against the circles registered in its own cell."""
+    def __init__(self, cell: int = 32):
+        self.cell = cell
+        self._cells: Dict[Cell, set[int]] = {}
+        self._keys: Dict[int, List[Cell]] = {}
+
+    def _cover(self, x: int, y: int, r: float) -> List[Cell]:
+        # bounding box clamped to the map before int(), so r=inf covers every cell
+        c, hi = self.cell, MAP_SIZE - 1
+        r = r + EPS                                  # boundary points count as inside
+        x0, x1 = int(max(x - r, 0) // c), int(min(x + r, hi) // c)
+        y0, y1 = int(max(y - r, 0) // c), int(min(y + r, hi) // c)
+        return [(i, j) for i in range(x0, x1 + 1) for j in range(y0, y1 + 1)]
+
+    def add(self, cid: int, x: int, y: int, r: float) -> None:
+        keys = self._cover(x, y, r)
+        for key in keys:
+            self._cells.setdefault(key, set()).add(cid)
+        self._keys[cid] = keys
+
+    def remove(self, cid: int) -> None:
+        for key in self._keys.pop(cid, ()):
+            ids = self._cells[key]
+            ids.discard(cid)
+            if not ids:
+                del self._cells[key]
+
+    def candidates(self, x: int, y: int) -> Iterable[int]:
+        return self._cells.get((x // self.cell, y // self.cell), ())
+
+    def __len__(self) -> int:
+        return len(self._keys)